@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+"""
+Benchmark building the <coordinates> string for the track LineString. Compares gliderkmz.encode_coordinates with
+the previous simplekml path (a LineString with one coordinate tuple added at a time) and checks that the output is
+identical. Requires simplekml.
+
+python benchmarks/bench_coordinates.py
+"""
+
+import os
+import sys
+import argparse
+import time
+import numpy as np
+import simplekml
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gliderkmz.gliderkmz import encode_coordinates
+
+
+def simplekml_coordinates(lon, lat):
+    """
+    Previous implementation: add each coordinate to a simplekml LineString and convert it to a string
+    """
+    track_values = np.column_stack((lon, lat, np.full(len(lon), 4.999999999999999))).tolist()
+    kml = simplekml.Kml()
+    track_line = kml.newlinestring(name="track")
+    for values in track_values:
+        track_line.coords.addcoordinates([(values[0], values[1], values[2])])
+    return str(track_line.coords)
+
+
+def best_time(func, *args, repeat=3):
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - t0)
+    return min(times), result
+
+
+def main(sizes):
+    rng = np.random.default_rng(0)
+    print(f'{"points":>8} {"simplekml (s)":>14} {"encode_coordinates (s)":>23} {"speedup":>8} {"identical":>10}')
+    for n in sizes:
+        lon = np.round(-74 + np.cumsum(rng.normal(0, 1e-3, n)), 5)
+        lat = np.round(39 + np.cumsum(rng.normal(0, 1e-3, n)), 5)
+        t_simplekml, expected = best_time(simplekml_coordinates, lon, lat)
+        t_encode, result = best_time(encode_coordinates, lon, lat)
+        print(f'{n:>8} {t_simplekml:>14.4f} {t_encode:>23.4f} {t_simplekml / t_encode:>7.1f}x {str(result == expected):>10}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='track lengths (number of GPS fixes) to benchmark')
+    args = parser.parse_args()
+    main(args.sizes)
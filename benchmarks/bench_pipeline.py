@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the kml pipeline end to end against a local stand-in for the glider API (see fixtures.py), at several
+sizes. Reports the time and peak memory of each stage:
+    fetch      request every endpoint for every deployment from the local server (includes parse)
+    parse      json decoding of the responses (summed over the request threads, part of fetch). Tracks are decoded as
+               they're streamed, so this includes reading their response bodies
+    transform  build_deployment_dict for every deployment
+    model      memory held by the deployment dictionaries between transform and render (traced run only)
+    render     render every deployment and the document for every kml type
+    main       gliderkmz.main for all of the kml types, writing the files to a temporary directory
+Timings are from a run without tracemalloc, the peak memory (traced python allocations) from a second run with it.
+
+Sizes are GLIDERSxPOINTS, the number of active deployments and the number of GPS fixes in each track (with a
+surfacing every 10 fixes):
+python benchmarks/bench_pipeline.py --sizes 1x1000 20x1000 100x1000 1x100000
+python benchmarks/bench_pipeline.py --fixtures fixtures/  # replay recorded responses instead
+"""
+
+import os
+import sys
+import argparse
+import contextlib
+import json
+import tempfile
+import time
+import tracemalloc
+import pandas  # loaded up front so the first transform doesn't include importing it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gliderkmz import gliderkmz, profiling
+from fixtures import SENSORS, FixtureServer, load_fixtures, synthetic_fixtures
+from gliderkmz.glider_api import GliderAPI
+
+KML_TYPES = ['deployed', 'deployed_ts', 'deployed_uv', 'deployed_ts_uv']
+STAGES = ['fetch', 'parse', 'transform', 'model', 'render', 'main']
+
+
+def parse_size(size):
+    gliders, points = size.lower().split('x')
+    return int(gliders), int(points)
+
+
+def run_pipeline(base_url, max_workers=8, trace_memory=False):
+    """
+    Run each stage of the pipeline against the local server
+    :returns dictionary of {stage: (seconds, peak traced memory in MB or None)}
+    """
+    results = dict()
+
+    @contextlib.contextmanager
+    def stage(name):
+        if trace_memory:
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1] / 1e6 if trace_memory else None
+        results[name] = (seconds, peak)
+
+    thresholds = gliderkmz.load_sensor_thresholds()
+    ts_now = time.strftime('%m/%d/%y %H:%M', time.gmtime())
+    with GliderAPI(base_url, pool_maxsize=max_workers) as api:
+        # the json decoding time is recorded by GliderAPI.get as the 'json decode' stage
+        with stage('fetch'), profiling.recording() as profiler:
+            deployments = api.active_deployments()
+            gd_apis = list(gliderkmz.fetch_deployments(api, deployments, SENSORS, max_workers=max_workers))
+        results['parse'] = (sum(row['seconds'] for row in profiler.rows() if row['stage'] == 'json decode'), None)
+
+        traced_before = tracemalloc.get_traced_memory()[0] if trace_memory else None
+        with stage('transform'):
+            deployment_dicts = [
+                gliderkmz.build_deployment_dict(gd_api, ts_now, 'glider_tail.png', SENSORS, thresholds)
+                for gd_api in gd_apis
+            ]
+        if trace_memory:
+            results['model'] = (None, (tracemalloc.get_traced_memory()[0] - traced_before) / 1e6)
+        del gd_apis
+
+        with stage('render'):
+            template = gliderkmz.get_template('kml_template.kml')
+            fragments = [gliderkmz.render_deployment(gliderkmz.TEMPLATE_DIR, KML_TYPES, dd) for dd in deployment_dicts]
+            for idx, kml_type in enumerate(KML_TYPES):
+                document_start, document_end = gliderkmz.render_document(template, document_name='Benchmark',
+                                                                         kml_type=kml_type, format_info=dict())
+                ''.join([document_start] + [f[idx] for f in fragments] + [document_end])
+        del deployment_dicts, fragments
+
+        with stage('main'), tempfile.TemporaryDirectory() as savedir:
+            gliderkmz.main('active', KML_TYPES, savedir, max_workers=max_workers, api=api)
+
+    return results
+
+
+def main(sizes, fixture_dir=None, max_workers=8, memory=True, output=None):
+    if fixture_dir:
+        cases = [('fixtures', lambda: load_fixtures(fixture_dir))]
+    else:
+        cases = [(size, lambda size=size: synthetic_fixtures(*parse_size(size))) for size in sizes]
+
+    # compile the templates before anything is timed
+    gliderkmz.get_template('kml_template.kml')
+    gliderkmz.get_template('deployment_macro.kml')
+
+    rows = []
+    print(f'{"size":>12} {"stage":>10} {"time (s)":>10} {"peak (MB)":>10}')
+    for size, build_fixtures in cases:
+        fixtures = build_fixtures()
+        with FixtureServer(fixtures) as base_url:
+            del fixtures
+            results = run_pipeline(base_url, max_workers)
+            if memory:
+                tracemalloc.start()
+                memory_results = run_pipeline(base_url, max_workers, trace_memory=True)
+                tracemalloc.stop()
+            else:
+                memory_results = dict()
+
+        for name in STAGES:
+            seconds = results.get(name, (None, None))[0]
+            peak = memory_results.get(name, (None, None))[1]
+            seconds_str = f'{seconds:.3f}' if seconds is not None else '-'
+            peak_str = f'{peak:.1f}' if peak is not None else '-'
+            print(f'{size:>12} {name:>10} {seconds_str:>10} {peak_str:>10}')
+            rows.append(dict(size=size, stage=name, seconds=seconds, peak_mb=peak))
+
+    if output:
+        with open(output, mode='w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', default=['1x1000', '20x1000', '100x1000', '1x100000'],
+                        help='synthetic fixture sizes to benchmark, GLIDERSxPOINTS')
+    parser.add_argument('--fixtures', help='directory of recorded fixtures to replay instead of synthetic fixtures')
+    parser.add_argument('--max-workers', type=int, default=8, help='maximum number of concurrent API requests')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run')
+    parser.add_argument('--output', help='save the results to a json file, to compare between versions')
+    args = parser.parse_args()
+    main(args.sizes, args.fixtures, args.max_workers, not args.no_memory, args.output)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+Benchmark building the track dataframe from the tracks API features. Times gliderkmz.build_track_df for increasing
+track lengths (up to 100k GPS fixes) and reports the time per point, which should stay roughly constant if the track
+builds in linear time. The old per-point np.append loop is timed for comparison up to --max-append points.
+
+python benchmarks/bench_track_build.py
+"""
+
+import os
+import sys
+import argparse
+import time
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gliderkmz.gliderkmz import build_track_df
+
+
+def synthetic_track(n):
+    """
+    Build n GeoJSON Point features (plus a LineString every 10 points, as returned by the tracks API) and a last
+    surfacing record
+    """
+    features = []
+    for i in range(n):
+        features.append(dict(
+            type='Feature',
+            geometry=dict(type='Point', coordinates=[-74.0 + i * 1e-5, 39.0 + i * 1e-5]),
+            properties=dict(gps_epoch=1700000000 + i * 60, sid=i // 10)
+        ))
+        if i % 10 == 0:
+            features.append(dict(type='Feature', geometry=dict(type='LineString', coordinates=[]), properties=dict()))
+    last_surfacing = dict(connect_time_epoch=1700000000 + n * 60, gps_lon_degrees=-73.0, gps_lat_degrees=40.0,
+                          surfacing_id=n // 10 + 1)
+    return features, last_surfacing
+
+
+def append_track(track_features, last_surfacing):
+    """
+    Previous implementation: grow each array with np.append for every Point feature
+    """
+    track_dict = dict(
+        gps_epoch=np.array([], dtype='int'),
+        lon=np.array([], dtype='float'),
+        lat=np.array([], dtype='float'),
+        sid=np.array([], dtype='int')
+    )
+    for tf in track_features:
+        if tf['geometry']['type'] == 'Point':
+            track_dict['gps_epoch'] = np.append(track_dict['gps_epoch'], tf['properties']['gps_epoch'])
+            track_dict['lon'] = np.append(track_dict['lon'], tf['geometry']['coordinates'][0])
+            track_dict['lat'] = np.append(track_dict['lat'], tf['geometry']['coordinates'][1])
+            track_dict['sid'] = np.append(track_dict['sid'], tf['properties']['sid'])
+    track_dict['gps_epoch'] = np.append(track_dict['gps_epoch'], last_surfacing['connect_time_epoch'])
+    track_dict['lon'] = np.append(track_dict['lon'], last_surfacing['gps_lon_degrees'])
+    track_dict['lat'] = np.append(track_dict['lat'], last_surfacing['gps_lat_degrees'])
+    track_dict['sid'] = np.append(track_dict['sid'], last_surfacing['surfacing_id'])
+    return track_dict
+
+
+def best_time(func, *args, repeat=3):
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main(sizes, max_append):
+    print(f'{"points":>8} {"build_track_df (s)":>19} {"us/point":>9} {"np.append (s)":>14} {"us/point":>9}')
+    for n in sizes:
+        features, last_surfacing = synthetic_track(n)
+        t_build = best_time(build_track_df, features, last_surfacing)
+        line = f'{n:>8} {t_build:>19.4f} {t_build / n * 1e6:>9.2f}'
+        if n <= max_append:
+            t_append = best_time(append_track, features, last_surfacing, repeat=1)
+            line = f'{line} {t_append:>14.4f} {t_append / n * 1e6:>9.2f}'
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000, 100000],
+                        help='track lengths (number of GPS fixes) to benchmark')
+    parser.add_argument('--max-append', type=int, default=20000,
+                        help='largest track to time with the old np.append loop')
+    args = parser.parse_args()
+    main(args.sizes, args.max_append)
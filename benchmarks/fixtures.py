@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+
+"""
+Glider API fixtures for the benchmarks: synthetic deployments at any size, responses recorded from the real API, and
+a local stand-in for the API that serves them, so the whole pipeline can run without the network.
+
+Fixtures are the decoded API response bodies:
+    dict(deployments={'data': [deployment records]},
+         deployment_data={deployment_name: dict(tracks={'type': 'FeatureCollection', 'features': [...]},
+                                                surfacings={'data': [...]},
+                                                sensors={sensor: {'data': [...]}})})
+
+Record the responses for some deployments from the real API (saved as json files in a directory):
+python benchmarks/fixtures.py fixtures/ maracoos_01-20240124T1612 ru40-20240215T1642
+"""
+
+import os
+import sys
+import argparse
+import json
+import threading
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SENSORS = ['m_battery', 'm_vacuum']
+START_EPOCH = 1704067200  # 2024-01-01
+
+
+class FixtureServer:
+    """
+    Local stand-in for the glider API that serves fixtures over HTTP. The responses are encoded once up front so
+    serving them costs as little as possible. Use as a context manager that returns the base url for GliderAPI:
+        with FixtureServer(fixtures) as base_url:
+            api = GliderAPI(base_url)
+    :param fixtures: fixtures dictionary (see synthetic_fixtures or load_fixtures)
+    """
+    def __init__(self, fixtures):
+        deployments = fixtures['deployments']
+        self.responses = {('deployments', 'active'): encode(deployments)}
+        for record in deployments['data']:
+            name = record['deployment_name']
+            data = fixtures['deployment_data'][name]
+            self.responses[('deployments', name)] = encode(dict(data=[record]))
+            self.responses[('tracks', name)] = encode(data['tracks'])
+            self.responses[('surfacings', name)] = encode(data['surfacings'])
+            for sensor, response in data['sensors'].items():
+                self.responses[('sensors', name, sensor)] = encode(response)
+        self.server = None
+
+    def __enter__(self):
+        responses = self.responses
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                endpoint = url.path.strip('/').split('/')[-1]
+                query = parse_qs(url.query, keep_blank_values=True)
+                if endpoint == 'deployments':
+                    key = (endpoint, query['deployment'][0] if 'deployment' in query else 'active')
+                elif endpoint == 'sensors':
+                    key = (endpoint, query['deployment'][0], query['sensor'][0])
+                else:
+                    key = (endpoint, query.get('deployment', [''])[0])
+                body = responses.get(key)
+                if body is None and endpoint == 'sensors':
+                    # sensors that weren't recorded have no data
+                    body = encode(dict(data=[]))
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def encode(response):
+    return json.dumps(response).encode('utf-8')
+
+
+def load_fixtures(fixture_dir):
+    """
+    Load fixtures saved by save_fixtures (e.g. responses recorded from the real API)
+    :param fixture_dir: directory of the fixture files
+    :returns fixtures dictionary
+    """
+    def load(*path):
+        with open(os.path.join(fixture_dir, *path), encoding='utf-8') as f:
+            return json.load(f)
+
+    deployments = load('deployments.json')
+    deployment_data = dict()
+    for record in deployments['data']:
+        name = record['deployment_name']
+        sensor_files = sorted(os.listdir(os.path.join(fixture_dir, name, 'sensors')))
+        deployment_data[name] = dict(
+            tracks=load(name, 'tracks.json'),
+            surfacings=load(name, 'surfacings.json'),
+            sensors={os.path.splitext(f)[0]: load(name, 'sensors', f) for f in sensor_files}
+        )
+    return dict(deployments=deployments, deployment_data=deployment_data)
+
+
+def nmea_degrees(x):
+    """
+    Convert decimal degrees to nmea (the inverse of gliderkmz.convert_nmea_degrees)
+    """
+    x = np.asarray(x, dtype='float')
+    degrees = np.floor(np.abs(x))
+    return np.round(np.sign(x) * (degrees * 100 + (np.abs(x) - degrees) * 60), 4)
+
+
+def record_fixtures(fixture_dir, deployments, api=None):
+    """
+    Download the API responses for a list of deployments and save them as fixtures
+    :param fixture_dir: directory to save the fixture files
+    :param deployments: list of deployment names
+    :param api: optional GliderAPI client
+    """
+    from gliderkmz.gliderkmz import CURRENT_SENSORS
+    from gliderkmz.glider_api import GliderAPI
+
+    api = api or GliderAPI()
+    records = [api.get('deployments', f'deployment={name}')['data'][0] for name in deployments]
+    deployment_data = dict()
+    for name in deployments:
+        deployment_data[name] = dict(
+            tracks=api.get('tracks', f'deployment={name}'),
+            surfacings=api.get('surfacings', f'deployment={name}'),
+            sensors={sensor: api.get('sensors', f'deployment={name}&sensor={sensor}')
+                     for sensor in SENSORS + CURRENT_SENSORS}
+        )
+    save_fixtures(fixture_dir, dict(deployments=dict(data=records), deployment_data=deployment_data))
+
+
+def save_fixtures(fixture_dir, fixtures):
+    """
+    Save fixtures as json files: deployments.json, and <deployment>/tracks.json, <deployment>/surfacings.json and
+    <deployment>/sensors/<sensor>.json for each deployment
+    :param fixture_dir: directory to save the fixture files
+    :param fixtures: fixtures dictionary
+    """
+    def save(response, *path):
+        os.makedirs(os.path.join(fixture_dir, *path[:-1]), exist_ok=True)
+        with open(os.path.join(fixture_dir, *path), mode='w', encoding='utf-8') as f:
+            json.dump(response, f)
+
+    save(fixtures['deployments'], 'deployments.json')
+    for name, data in fixtures['deployment_data'].items():
+        save(data['tracks'], name, 'tracks.json')
+        save(data['surfacings'], name, 'surfacings.json')
+        for sensor, response in data['sensors'].items():
+            save(response, name, 'sensors', f'{sensor}.json')
+
+
+def synthetic_deployment(glider_idx, track_points, points_per_surfacing=10, sensor_points=10, rng=None):
+    """
+    Build the API responses for one synthetic deployment: a random walk track with a surfacing every
+    points_per_surfacing GPS fixes, a surfacing record for each surfacing, and sensor data (including the depth-averaged
+    current) around each surfacing
+    :param glider_idx: glider number, used for the names and starting location
+    :param track_points: number of GPS fixes in the track
+    :param points_per_surfacing: number of GPS fixes for each surfacing
+    :param sensor_points: number of values for each sensor at each surfacing
+    :param rng: numpy random Generator
+    :returns deployment record and dictionary of the responses (see module docstring)
+    """
+    from gliderkmz.gliderkmz import CURRENT_SENSORS
+
+    rng = rng or np.random.default_rng(glider_idx)
+    glider_name = f'bench{glider_idx:03d}'
+    deployment_name = f'{glider_name}-20240101T0000'
+
+    # track: GPS fixes a minute apart at each surfacing, surfacings 4 hours apart
+    point = np.arange(track_points)
+    sid = point // points_per_surfacing
+    n_surfacings = int(sid[-1]) + 1
+    epoch = START_EPOCH + sid * 14400 + (point % points_per_surfacing) * 60
+    lon = np.round(-74 + glider_idx * 0.1 + np.cumsum(rng.normal(0, 2e-3, track_points)), 5)
+    lat = np.round(39 + np.cumsum(rng.normal(0, 2e-3, track_points)), 5)
+    features = []
+    for s in range(n_surfacings):
+        for i in range(s * points_per_surfacing, min((s + 1) * points_per_surfacing, track_points)):
+            features.append(dict(type='Feature',
+                                 geometry=dict(type='Point', coordinates=[lon[i].item(), lat[i].item()]),
+                                 properties=dict(gps_epoch=int(epoch[i]), sid=s)))
+        features.append(dict(type='Feature', geometry=dict(type='LineString', coordinates=[]), properties=dict()))
+
+    # surfacings: the first GPS fix of each surfacing
+    first = np.arange(n_surfacings) * points_per_surfacing
+    last = np.minimum(first + points_per_surfacing - 1, track_points - 1)
+    gps_delay = rng.choice([30, 900, 4000], n_surfacings)
+    wpt_lon = np.round(lon[first] + 0.2, 5)
+    wpt_lat = np.round(lat[first] + 0.5, 5)
+    surfacings = []
+    for s in range(n_surfacings):
+        f = first[s]
+        surfacings.append(dict(
+            surfacing_id=s,
+            connect_time_epoch=int(epoch[f] + gps_delay[s]),
+            disconnect_time_epoch=int(epoch[last[s]] + 60),
+            gps_timestamp_epoch=int(epoch[f]),
+            gps_lat=nmea_degrees(lat[f]).item(),
+            gps_lon=nmea_degrees(lon[f]).item(),
+            gps_lat_degrees=lat[f].item(),
+            gps_lon_degrees=lon[f].item(),
+            surface_reason='hit waypoint',
+            mission='bench.mi',
+            filename=f'{glider_name}-2024-001-0-{s}',
+            the8x3_filename=f'0000{s:04d}',
+            dsvr_log_name=f'{glider_name}_network_{s}.log',
+            segment_errors=0, segment_warnings=1, segment_oddities=2,
+            mission_errors=0, mission_warnings=0, mission_oddities=1,
+            total_errors=0, total_warnings=3, total_oddities=4,
+            waypoint_lat=nmea_degrees(wpt_lat[s]).item(),
+            waypoint_lon=nmea_degrees(wpt_lon[s]).item(),
+            waypoint_range_meters=45000.0,
+            waypoint_bearing_degrees=20,
+            call_length_seconds=300,
+            dive_time_seconds=14000,
+            segment_distance_m=3000.0
+        ))
+
+    # sensors: values a minute apart ending at each disconnect
+    sensor_epochs = (np.array([s['disconnect_time_epoch'] for s in surfacings])[:, None] -
+                     np.arange(sensor_points)[::-1] * 60).ravel()
+    sensor_ts = np.datetime_as_string(sensor_epochs.astype('datetime64[s]')).tolist()
+    sensors = dict()
+    for sensor, (mean, std) in zip(SENSORS + CURRENT_SENSORS, [(14, 1), (8, 1), (0, 0.1), (0, 0.1)]):
+        values = np.round(rng.normal(mean, std, len(sensor_epochs)), 2).tolist()
+        sensors[sensor] = dict(data=[dict(epoch_seconds=int(e), ts=ts.replace('T', ' '), value=v)
+                                     for e, ts, v in zip(sensor_epochs.tolist(), sensor_ts, values)])
+
+    deployment = dict(
+        glider_name=glider_name,
+        deployment_name=deployment_name,
+        distance_flown_km=float(n_surfacings * 3),
+        start_date_epoch=START_EPOCH,
+        end_date_epoch=None,
+        last_surfacing=surfacings[-1]
+    )
+    responses = dict(
+        tracks=dict(type='FeatureCollection', features=features),
+        surfacings=dict(data=surfacings),
+        sensors=sensors
+    )
+    return deployment, responses
+
+
+def synthetic_fixtures(n_gliders, track_points, seed=0, **kwargs):
+    """
+    Build fixtures for n_gliders synthetic active deployments
+    :param n_gliders: number of deployments
+    :param track_points: number of GPS fixes in each track
+    :param seed: random seed
+    :param kwargs: other arguments for synthetic_deployment
+    :returns fixtures dictionary
+    """
+    rng = np.random.default_rng(seed)
+    records = []
+    deployment_data = dict()
+    for idx in range(n_gliders):
+        deployment, responses = synthetic_deployment(idx, track_points, rng=rng, **kwargs)
+        records.append(deployment)
+        deployment_data[deployment['deployment_name']] = responses
+    return dict(deployments=dict(data=records), deployment_data=deployment_data)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('fixture_dir', help='directory to save the fixture files')
+    parser.add_argument('deployments', nargs='+', help='deployment names to record')
+    args = parser.parse_args()
+    record_fixtures(args.fixture_dir, args.deployments)
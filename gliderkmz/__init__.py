@@ -0,0 +1,4 @@
+"""
+Tools for generating kmls and kmzs for visualizing glider deployments from the RUCOOL glider API. The kml templates
+and sensor thresholds config are installed with the package.
+"""
@@ -0,0 +1,3 @@
+from gliderkmz.gliderkmz_cli import main
+
+main()
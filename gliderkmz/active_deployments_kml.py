@@ -2,7 +2,7 @@
 
 """
 Author: lgarzio on 2/28/2024
-Last modified: lgarzio on 3/13/2024
+Last modified: lgarzio on 3/12/2024
 Test glider kmz generation
 """
 
@@ -10,108 +10,27 @@ import os
 import datetime as dt
 import pandas as pd
 import numpy as np
-import requests
-import simplekml
-import yaml
-from jinja2 import Environment, FileSystemLoader
+from gliderkmz.glider_api import GliderAPI
+from gliderkmz.gliderkmz import add_sensor_values, build_popup_dict, convert_nmea_degrees, encode_coordinates, \
+    load_sensor_thresholds
+from gliderkmz.kml_templates import get_template
 pd.set_option('display.width', 320, "display.max_columns", 10)
 
 
-def add_sensor_values(data_dict, sensor_name, sdf):
-    """
-    Find data from a sensor within a specific time range (+/- 5 minutes from surface disconnect time). Add the median
-    of the values to the dictionary summaries
-    """
-    yml_file = '/Users/garzio/Documents/repo/lgarzio/gliderkmz/configs/sensor_thresholds.yml'
-    with open(yml_file) as f:
-        sensor_thresholds = yaml.safe_load(f)
-    thresholds = sensor_thresholds[sensor_name]
-
-    ts = pd.to_datetime(data_dict['disconnect_ts'])
-    t0 = ts - pd.Timedelta(minutes=5)
-    t1 = ts + pd.Timedelta(minutes=5)
-
-    try:
-        sensor_value = np.round(np.median(sdf.loc[np.logical_and(sdf.ts >= t0, sdf.ts <= t1)].value), 2)
-        if sensor_value <= thresholds['fail_threshold']:
-            bgcolor = 'darkred'
-        elif thresholds['suspect_span'][0] < sensor_value < thresholds['suspect_span'][1]:
-            bgcolor = 'BEA60E'  # yellow BEA60E
-        else:
-            bgcolor = 'green'
-    except IndexError:
-        sensor_value = None
-        bgcolor = 'BEA60E'  # yellow BEA60E
-    data_dict[sensor_name] = sensor_value
-    data_dict[f'{sensor_name}_bgcolor'] = bgcolor
-
-
-def build_popup_dict(data):
-    """
-    Build the dictionaries for the data that populates the pop-up text boxes
-    :param data: dictionary
-    """
-    connect_ts = format_ts_epoch(data['connect_time_epoch'])
-    disconnect_ts = format_ts_epoch(data['disconnect_time_epoch'])
-    gps_connect_ts = format_ts_epoch(data['gps_timestamp_epoch'])
-
-    gps_connect_timedelta = dt.datetime.fromtimestamp(data['connect_time_epoch'], dt.UTC) - dt.datetime.fromtimestamp(data['gps_timestamp_epoch'], dt.UTC)
-    if gps_connect_timedelta.seconds >= 3600:  # 3600 = 1 hour
-        gps_bgcolor = 'darkred'
-    elif 3600 > gps_connect_timedelta.seconds > 600:  # between 10 mins (600) and 1 hour (3600)
-        gps_bgcolor = 'BEA60E'  # yellow BEA60E
-    else:  # < 10 minutes
-        gps_bgcolor = 'green'
-
-    try:
-        waypoint_range_km = data['waypoint_range_meters'] / 1000
-    except TypeError:
-        waypoint_range_km = None
-
-    popup_dict = dict(
-        connect_ts=connect_ts,
-        disconnect_ts=disconnect_ts,
-        gps_lat=np.round(convert_nmea_degrees(data['gps_lat']), 2),
-        gps_lon=np.round(convert_nmea_degrees(data['gps_lon']), 2),
-        gps_connect_ts=gps_connect_ts,
-        gps_bgcolor=gps_bgcolor,
-        reason=data['surface_reason'],
-        mission=data['mission'],
-        filename=data['filename'],
-        filename_8x3=data['the8x3_filename'],
-        dsvr_log=data['dsvr_log_name'],
-        segment_ewo=f"{data['segment_errors']}/{data['segment_warnings']}/{data['segment_oddities']}",
-        mission_ewo=f"{data['mission_errors']}/{data['mission_warnings']}/{data['mission_oddities']}",
-        total_ewo=f"{data['total_errors']}/{data['total_warnings']}/{data['total_oddities']}",
-        waypoint_lat=data['waypoint_lat'],
-        waypoint_lon=data['waypoint_lon'],
-        waypoint_range=waypoint_range_km,
-        waypoint_bearing=data['waypoint_bearing_degrees']
-    )
-
-    return popup_dict
+# def format_ts_str(timestamp):
+#     return dt.datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d %H:%M')
 
 
-def convert_nmea_degrees(x):
+def main(savedir, kml_type):
     """
-    Convert lat/lon coordinates from nmea to decimal degrees
+    Generate the kml of all active deployments
+    :param savedir: directory to save the output file
+    :param kml_type: 'deployed' 'deployed_ts' 'deployed_uv' 'deployed_ts_uv'
     """
-    try:
-        degrees = np.sign(x) * (np.floor(np.abs(x)/100) + np.mod(np.abs(x), 100) / 60)
-    except TypeError:
-        degrees = None
-
-    return degrees
-
-
-def format_ts_epoch(timestamp):
-    return dt.datetime.fromtimestamp(timestamp, dt.UTC).strftime('%Y-%m-%d %H:%M')
-
-
-def main(deployment, kml_type, savedir):
+    #gliders = ['maracoos_02', 'ru40']
     sensor_list = ['m_battery', 'm_vacuum']
-    templatedir = '/Users/garzio/Documents/repo/lgarzio/gliderkmz/templates/'
-
+    sensor_thresholds = load_sensor_thresholds()
+    savefile = os.path.join(savedir, 'active_deployments-ts-test.kml')
     glider_tails = 'https://rucool.marine.rutgers.edu/gliders/glider_tails/'  # /www/web/rucool/gliders/glider_tails
     # old glider tails location: https://marine.rutgers.edu/~kerfoot/icons/glider_tails/
 
@@ -123,66 +42,46 @@ def main(deployment, kml_type, savedir):
     # green ('ff83c995'), gray ('ffc4c9d8')
     colors = ['ffe9d043', 'ff9e36d7', 'ffd7369e', 'ff43d0e9', 'ff3877f3', 'ff83c995', 'ffc4c9d8']
 
-    # load the templates
-    environment = Environment(loader=FileSystemLoader(templatedir))
-    template = environment.get_template('kml_template.kml')
-    format_template = environment.get_template('format_active_deployments_macro.kml')
-    deployment_template = environment.get_template('deployment_macro.kml')
-    track_template = environment.get_template('track_macro.kml')
-    surfacing_template = environment.get_template('surface_event_macro.kml')
-    text_box_template = environment.get_template('text_box_macro.kml')
-
-    # define filename
-    if kml_type == 'deployed':
-        ext = ''
-    else:
-        ext = f'_{kml_type.split("deployed_")[-1]}'
-
     ts_now = dt.datetime.now(dt.UTC).strftime('%m/%d/%y %H:%M')
 
-    glider_api = 'https://marine.rutgers.edu/cool/data/gliders/api/'
-
-    glider_deployments = []
-    if deployment == 'active':  # 'deployed' 'deployed_ts' 'deployed_uv' 'deployed_ts_uv'
-        savefile = os.path.join(savedir, f'active_deployments{ext}.kml')
-        document_name = 'Active Deployments'
-        active_deployments = requests.get(f'{glider_api}deployments/?active').json()['data']
-        for ad in active_deployments:
-            glider_deployments.append(ad['deployment_name'])
+    # load the templates
+    template = get_template('active_deployments_template.kml')
 
-        # duplicate track colors if necessary
-        if len(glider_deployments) > len(colors):
-            repeatx = int(np.ceil(len(glider_deployments) / len(colors)))
-            colors = colors * repeatx
+    api = GliderAPI()
+    active_deployments = api.active_deployments()
 
-    else:
-        savefile = os.path.join(savedir, f'{deployment}{ext}.kml')
-        document_name = 'Glider Deployments'
-        glider_deployments.append(deployment)
-        colors = ['ff43d0e9']  # yellow
+    if len(active_deployments) > len(colors):
+        repeatx = int(np.ceil(len(active_deployments) / len(colors)))
+        colors = colors * repeatx
 
+    # build the formatting for the kml file
     format_dict = dict()
-    deployment_dict = dict()
-    for idx, gd in enumerate(glider_deployments):
-        deployment_api = requests.get(f'{glider_api}deployments/?deployment={gd}').json()['data'][0]
-
-        # build the dictionary for the formatting section of the kml
-        glider_name = deployment_api['glider_name']
-        deployment_name = deployment_api['deployment_name']
-        glider_tail = os.path.join(glider_tails, f'{glider_name}.png')
-        format_dict[deployment_name] = dict(
+    for idx, ad in enumerate(active_deployments):
+        glider_name = ad['glider_name']
+        print(f'{glider_name}: color {colors[idx]}')
+        #if glider_name in gliders:
+        deployment = ad['deployment_name']
+        format_dict[deployment] = dict(
             name=glider_name,
-            glider_tail=glider_tail,
+            glider_tail=os.path.join(glider_tails, f'{glider_name}.png'),
             deployment_color=colors[idx]
         )
 
+    # build all of the information to populate each deployment
+    deployment_dict = dict()
+    for ad in active_deployments:
+        glider_name = ad['glider_name']
+        #if glider_name in gliders:
+        deployment = ad['deployment_name']
+        glider_tail = os.path.join(glider_tails, f'{glider_name}.png')
+
         # get distance flow and calculate days deployed
-        distance_flown_km = deployment_api['distance_flown_km']
+        distance_flown_km = ad['distance_flown_km']
         try:
-            end = dt.datetime.fromtimestamp(deployment_api['end_date_epoch'], dt.UTC)
+            end = dt.datetime.fromtimestamp(ad['end_date_epoch'], dt.UTC)
         except TypeError:
             end = dt.datetime.now(dt.UTC)
-        start = dt.datetime.fromtimestamp(deployment_api['start_date_epoch'], dt.UTC)
+        start = dt.datetime.fromtimestamp(ad['start_date_epoch'], dt.UTC)
         seconds_deployed = ((end - start).days * 86400) + (end - start).seconds
         days_deployed = np.round(seconds_deployed / 86400, 2)
 
@@ -190,25 +89,25 @@ def main(deployment, kml_type, savedir):
         # per sensor per deployment)
         sensor_data = dict()
         for sensor in sensor_list:
-            sensor_api = requests.get(f'{glider_api}sensors/?deployment={deployment_name}&sensor={sensor}').json()['data']
+            sensor_api = api.sensor(deployment, sensor)
             sensor_df = pd.DataFrame(sensor_api)
             sensor_df.sort_values(by='epoch_seconds', inplace=True, ignore_index=True)
             sensor_df['ts'] = pd.to_datetime(sensor_df['ts'])
             sensor_data[sensor] = sensor_df
 
         # build the dictionary for the last surfacing information
-        ls_api = deployment_api['last_surfacing']
+        ls_api = ad['last_surfacing']
         last_surfacing_popup_dict = build_popup_dict(ls_api)
         ls_gps_lat_degrees = ls_api['gps_lat_degrees']
         ls_gps_lon_degrees = ls_api['gps_lon_degrees']
 
         # add values for battery and vacuum to the last surfacing information
         for sensor in sensor_list:
-            add_sensor_values(last_surfacing_popup_dict, sensor, sensor_data[sensor])
+            add_sensor_values(last_surfacing_popup_dict, sensor, sensor_data[sensor], sensor_thresholds[sensor])
 
         # add dive information (time, distance, speed)
-        last_surfacing_popup_dict['dive_time'] = int(np.round(ls_api['dive_time_seconds'] / 60))  # minutes
-        last_surfacing_popup_dict['dive_dist'] = np.round(ls_api['segment_distance_m'] / 1000, 2)  # km
+        last_surfacing_popup_dict['dive_time'] = int(np.round(ls_api['dive_time_seconds'] / 60)),  # minutes
+        last_surfacing_popup_dict['dive_dist'] = np.round(ls_api['segment_distance_m'] / 1000, 2),  # km
         last_surfacing_popup_dict['total_speed'] = None  # m/s
         last_surfacing_popup_dict['total_speed_bearing'] = None
         last_surfacing_popup_dict['current_speed'] = None  # m/s
@@ -230,7 +129,7 @@ def main(deployment, kml_type, savedir):
             lat=np.array([], dtype='float'),
             sid=np.array([], dtype='int')
         )
-        track_features = requests.get(f'{glider_api}tracks/?deployment={deployment_name}').json()['features']
+        track_features = api.tracks(deployment)
         for tf in track_features:
             if tf['geometry']['type'] == 'Point':
                 track_dict['gps_epoch'] = np.append(track_dict['gps_epoch'], tf['properties']['gps_epoch'])
@@ -252,32 +151,25 @@ def main(deployment, kml_type, savedir):
         deployment_sid = int(track_df.iloc[0]['sid'])
 
         if kml_type in ['deployed', 'deployed_uv']:
-            track_df = track_df.copy()[['lon', 'lat']]
-            track_df['height'] = 4.999999999999999
-            track_values = track_df.values.tolist()
-            kml = simplekml.Kml()
-            track_data = kml.newlinestring(name="track")
-            for values in track_values:
-                track_data.coords.addcoordinates([(values[0], values[1], values[2])])
+            track_data = encode_coordinates(track_df['lon'].to_numpy(), track_df['lat'].to_numpy())
         elif kml_type in ['deployed_ts', 'deployed_ts_uv']:
-            # build the dictionary that contains the track information to input into the kml template
-            track_data = dict()
-            for idx, row in track_df.iterrows():
-                if idx > 0:
-                    prev_row = track_df.iloc[idx - 1]
-                    start = dt.datetime.fromtimestamp(prev_row.gps_epoch, dt.UTC).strftime('%Y-%m-%dT%H:%M:%SZ')
-                    end = dt.datetime.fromtimestamp(row.gps_epoch, dt.UTC).strftime('%Y-%m-%dT%H:%M:%SZ')
-                    track_data[idx] = dict(
-                        start=start,
-                        end=end,
-                        start_lon=prev_row.lon,
-                        start_lat=prev_row.lat,
-                        end_lon=row.lon,
-                        end_lat=row.lat
-                    )
+            # build the start/end times and locations of each track segment to input into the kml template
+            track_ts = pd.to_datetime(track_df['gps_epoch'], unit='s', utc=True).dt.strftime(
+                '%Y-%m-%dT%H:%M:%SZ').tolist()
+            track_lon = track_df['lon'].tolist()
+            track_lat = track_df['lat'].tolist()
+            track_data = dict(
+                start=track_ts[:-1],
+                end=track_ts[1:],
+                start_lon=track_lon[:-1],
+                start_lat=track_lat[:-1],
+                end_lon=track_lon[1:],
+                end_lat=track_lat[1:]
+            )
 
         # surface events
-        surface_events = requests.get(f'{glider_api}surfacings/?deployment={deployment_name}').json()['data']
+        surface_events = api.surfacings(deployment)
+        surf_df = pd.DataFrame(surface_events)
 
         # calculate previous 24 hours
         t24h = pd.to_datetime(ts_now) - pd.Timedelta(hours=24)
@@ -341,11 +233,12 @@ def main(deployment, kml_type, savedir):
 
             # add data from sensors to the popup
             for sensor in sensor_list:
-                add_sensor_values(surface_events_dict[folder_name][idx]['surface_event_popup'], sensor, sensor_data[sensor])
+                add_sensor_values(surface_events_dict[folder_name][idx]['surface_event_popup'], sensor,
+                                  sensor_data[sensor], sensor_thresholds[sensor])
 
             # add dive information to the surfacing event (time, distance, speed)
-            surface_events_dict[folder_name][idx]['surface_event_popup']['dive_time'] = None  # minutes
-            surface_events_dict[folder_name][idx]['surface_event_popup']['dive_dist'] = None  # km
+            surface_events_dict[folder_name][idx]['surface_event_popup']['dive_time'] = None,  # minutes
+            surface_events_dict[folder_name][idx]['surface_event_popup']['dive_dist'] = None,  # km
             surface_events_dict[folder_name][idx]['surface_event_popup']['total_speed'] = None  # m/s
             surface_events_dict[folder_name][idx]['surface_event_popup']['total_speed_bearing'] = None
             surface_events_dict[folder_name][idx]['surface_event_popup']['current_speed'] = None  # m/s
@@ -365,19 +258,19 @@ def main(deployment, kml_type, savedir):
 
                 # add values for battery and vacuum to deployment information
                 for sensor in sensor_list:
-                    add_sensor_values(deployment_popup_dict, sensor, sensor_data[sensor])
+                    add_sensor_values(deployment_popup_dict, sensor, sensor_data[sensor], sensor_thresholds[sensor])
 
                 # add dive information (time, distance, speed)
-                deployment_popup_dict['dive_time'] = None  # minutes
-                deployment_popup_dict['dive_dist'] = None  # km
-                deployment_popup_dict['total_speed'] = None  # m/s
-                deployment_popup_dict['total_speed_bearing'] = None
+                deployment_popup_dict['dive_time'] = 'N/A',  # minutes
+                deployment_popup_dict['dive_dist'] = 'N/A',  # km
+                deployment_popup_dict['total_speed'] = 'N/A'  # m/s
+                deployment_popup_dict['total_speed_bearing'] = 'N/A'
                 deployment_popup_dict['current_speed'] = None  # m/s
                 deployment_popup_dict['current_speed_bearing'] = None
-                deployment_popup_dict['glide_speed'] = None  # m/s
-                deployment_popup_dict['glide_speed_bearing'] = None
+                deployment_popup_dict['glide_speed'] = 'N/A'  # m/s
+                deployment_popup_dict['glide_speed_bearing'] = 'N/A'
 
-        deployment_dict[deployment_name] = dict(
+        deployment_dict[deployment] = dict(
             ts_now=ts_now,
             glider_name=glider_name,
             glider_tail=glider_tail,
@@ -405,7 +298,6 @@ def main(deployment, kml_type, savedir):
 
     # render all of the information into the kml template
     content = template.render(
-        document_name=document_name,
         kml_type=kml_type,
         format_info=format_dict,
         deployment_info=deployment_dict
@@ -416,7 +308,6 @@ def main(deployment, kml_type, savedir):
 
 
 if __name__ == '__main__':
-    deployment = 'active'  # active or maracoos_01-20240124T1612
-    kml_type = 'deployed_ts_uv'  # 'deployed' 'deployed_ts' 'deployed_uv' 'deployed_ts_uv'
     savedir = '/Users/garzio/Documents/repo/lgarzio/gliderkmz/templates/'
-    main(deployment, kml_type, savedir)
+    kml_type = 'deployed_ts_uv'  # 'deployed' 'deployed_ts' 'deployed_uv' 'deployed_ts_uv'
+    main(savedir, kml_type)
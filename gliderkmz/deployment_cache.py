@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+
+"""
+Local cache of the track, surfacing and sensor records for each deployment. Records are stored in one SQLite file
+per deployment along with the last time seen for each endpoint, so later runs only request records newer than what
+is already cached and merge them in. Each endpoint gets a full refresh periodically to pick up any records that were
+reprocessed or removed on the server. Track points (gps_epoch, lon, lat, sid) and sensor data (epoch_seconds, value)
+are stored as typed columns and read back with one query each, since json decoding every cached point made reading
+the cache slower than downloading from the API. Surfacings are stored as json records.
+"""
+
+import os
+import json
+import sqlite3
+import time
+import numpy as np
+from gliderkmz import json_decode
+from gliderkmz.glider_api import filter_columns, filter_records
+
+
+class DeploymentCache:
+    """
+    Wraps a GliderAPI client with the same methods, serving tracks, surfacings and sensor data from the local cache and
+    only requesting new records from the API. The cache always holds the entire history of each endpoint, so time
+    windows (t0, t1) are applied to the cached records instead of the API requests.
+    :param api: GliderAPI client
+    :param cache_dir: directory for the cache files
+    :param full_refresh_hours: re-download the entire history for an endpoint if the last full download is older
+        than this
+    :param overlap_hours: incremental requests start this long before the last cached record, to pick up records
+        that arrive late
+    """
+    def __init__(self, api, cache_dir, full_refresh_hours=24, overlap_hours=6):
+        self.api = api
+        self.cache_dir = cache_dir
+        self.full_refresh_seconds = full_refresh_hours * 3600
+        self.overlap_seconds = overlap_hours * 3600
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __getattr__(self, name):
+        # anything that isn't cached (e.g. active_deployments, deployment, close) goes straight to the API client
+        return getattr(self.api, name)
+
+    def cache_file(self, deployment_name):
+        return os.path.join(self.cache_dir, f'{deployment_name}.sqlite')
+
+    def connect(self, deployment_name):
+        conn = sqlite3.connect(self.cache_file(deployment_name), timeout=60)
+        conn.execute('CREATE TABLE IF NOT EXISTS records '
+                     '(endpoint TEXT, key TEXT, epoch REAL, data TEXT, PRIMARY KEY (endpoint, key))')
+        conn.execute('CREATE TABLE IF NOT EXISTS track_points '
+                     '(gps_epoch INTEGER, lon REAL, lat REAL, sid INTEGER, PRIMARY KEY (gps_epoch, sid)) WITHOUT ROWID')
+        conn.execute('CREATE TABLE IF NOT EXISTS sensor_points '
+                     '(sensor TEXT, epoch_seconds REAL, value REAL, PRIMARY KEY (sensor, epoch_seconds)) WITHOUT ROWID')
+        conn.execute('CREATE TABLE IF NOT EXISTS fetches '
+                     '(endpoint TEXT PRIMARY KEY, last_epoch REAL, last_full_refresh REAL)')
+        return conn
+
+    def fetch_since(self, conn, endpoint):
+        """
+        Find where the next request for an endpoint starts
+        :returns the start time of the request (None for a full refresh of the entire history), and the time of the
+            last full refresh
+        """
+        row = conn.execute('SELECT last_epoch, last_full_refresh FROM fetches WHERE endpoint=?', (endpoint,)).fetchone()
+        now = time.time()
+        if row is None or row[0] is None or now - row[1] >= self.full_refresh_seconds:
+            return None, now
+        return row[0] - self.overlap_seconds, row[1]
+
+    def update(self, deployment_name, endpoint, fetch, key, epoch):
+        """
+        Grab the new records for an endpoint from the API, merge them into the cache and return all of the cached
+        records sorted by time
+        :param deployment_name: deployment name
+        :param endpoint: name of the cached endpoint, e.g. 'tracks' or 'sensors/m_battery'
+        :param fetch: function that takes t0 (None for the full history) and returns the records from the API
+        :param key: function that returns the unique key for a record
+        :param epoch: function that returns the time of a record (seconds since 1970-01-01)
+        """
+        conn = self.connect(deployment_name)
+        try:
+            t0, last_full_refresh = self.fetch_since(conn, endpoint)
+            records = fetch(t0)
+
+            with conn:
+                if t0 is None:
+                    conn.execute('DELETE FROM records WHERE endpoint=?', (endpoint,))
+                conn.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)',
+                                 [(endpoint, str(key(r)), epoch(r), json.dumps(r)) for r in records])
+                last_epoch = conn.execute('SELECT MAX(epoch) FROM records WHERE endpoint=?', (endpoint,)).fetchone()[0]
+                conn.execute('INSERT OR REPLACE INTO fetches VALUES (?, ?, ?)',
+                             (endpoint, last_epoch, last_full_refresh))
+
+            cached = conn.execute('SELECT data FROM records WHERE endpoint=? ORDER BY epoch, key', (endpoint,))
+            return [json_decode.loads(r[0]) for r in cached]
+        finally:
+            conn.close()
+
+    def sensor(self, deployment_name, sensor, t0=None, t1=None):
+        """
+        Grab the new data for a sensor from the API, merge them into the cache and return all of the cached data
+        sorted by time. Only the time and value of each record are cached.
+        :returns list of dictionaries with epoch_seconds and value
+        """
+        endpoint = f'sensor_points/{sensor}'
+        conn = self.connect(deployment_name)
+        try:
+            since, last_full_refresh = self.fetch_since(conn, endpoint)
+            records = self.api.sensor(deployment_name, sensor, t0=since)
+
+            with conn:
+                if since is None:
+                    conn.execute('DELETE FROM sensor_points WHERE sensor=?', (sensor,))
+                    # sensor data cached as json records by earlier versions
+                    conn.execute('DELETE FROM records WHERE endpoint=?', (f'sensors/{sensor}',))
+                conn.executemany('INSERT OR REPLACE INTO sensor_points VALUES (?, ?, ?)',
+                                 [(sensor, r['epoch_seconds'], r['value']) for r in records])
+                last_epoch = conn.execute('SELECT MAX(epoch_seconds) FROM sensor_points WHERE sensor=?',
+                                          (sensor,)).fetchone()[0]
+                conn.execute('INSERT OR REPLACE INTO fetches VALUES (?, ?, ?)',
+                             (endpoint, last_epoch, last_full_refresh))
+
+            rows = conn.execute('SELECT epoch_seconds, value FROM sensor_points WHERE sensor=? ORDER BY epoch_seconds',
+                                (sensor,)).fetchall()
+        finally:
+            conn.close()
+
+        return filter_records([dict(epoch_seconds=e, value=v) for e, v in rows], 'epoch_seconds', t0, t1)
+
+    def surfacings(self, deployment_name, t0=None, t1=None):
+        records = self.update(
+            deployment_name,
+            'surfacings',
+            lambda since: self.api.surfacings(deployment_name, t0=since),
+            key=lambda r: r['surfacing_id'],
+            epoch=lambda r: r['connect_time_epoch']
+        )
+        return filter_records(records, 'connect_time_epoch', t0, t1)
+
+    def track_columns(self, deployment_name, t0=None, t1=None):
+        """
+        Grab the new track points from the API, merge them into the cache and return all of the cached track points
+        sorted by time, as columns (see json_decode.track_columns)
+        :returns dictionary of numpy arrays gps_epoch, lon, lat and sid
+        """
+        conn = self.connect(deployment_name)
+        try:
+            since, last_full_refresh = self.fetch_since(conn, 'track_points')
+            columns = self.api.track_columns(deployment_name, t0=since)
+
+            with conn:
+                if since is None:
+                    conn.execute('DELETE FROM track_points')
+                    # tracks cached as json records by earlier versions
+                    conn.execute("DELETE FROM records WHERE endpoint='tracks'")
+                conn.executemany('INSERT OR REPLACE INTO track_points VALUES (?, ?, ?, ?)',
+                                 zip(*(columns[col].tolist() for col in ['gps_epoch', 'lon', 'lat', 'sid'])))
+                last_epoch = conn.execute('SELECT MAX(gps_epoch) FROM track_points').fetchone()[0]
+                conn.execute('INSERT OR REPLACE INTO fetches VALUES (?, ?, ?)',
+                             ('track_points', last_epoch, last_full_refresh))
+
+            rows = conn.execute('SELECT gps_epoch, lon, lat, sid FROM track_points ORDER BY gps_epoch, sid').fetchall()
+        finally:
+            conn.close()
+
+        points = np.array(rows, dtype=[('gps_epoch', 'int64'), ('lon', 'float'), ('lat', 'float'), ('sid', 'int64')])
+        columns = {col: np.ascontiguousarray(points[col]) for col in points.dtype.names}
+        return filter_columns(columns, 'gps_epoch', t0, t1)
+
+    def tracks(self, deployment_name, t0=None, t1=None):
+        # only the Point features are used to build the track, so those are the only features cached
+        return point_features(self.track_columns(deployment_name, t0, t1))
+
+
+def point_features(columns):
+    """
+    Convert track columns (see json_decode.track_columns) to GeoJSON Point features
+    """
+    return [dict(type='Feature', geometry=dict(type='Point', coordinates=[lon, lat]),
+                 properties=dict(gps_epoch=gps_epoch, sid=sid))
+            for gps_epoch, lon, lat, sid in zip(*(columns[col].tolist() for col in ['gps_epoch', 'lon', 'lat', 'sid']))]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+"""
+Keep the rendered kml <Folder> for each deployment next to the output files, along with a fingerprint of the
+deployment (the last surfacing and the settings it was rendered with). When a deployment hasn't surfaced since the
+previous run, its saved <Folder> is reused instead of downloading and processing the deployment again.
+"""
+
+import os
+import json
+import tempfile
+import time
+
+
+def deployment_fingerprint(deployment_api, **settings):
+    """
+    Fingerprint of a deployment record from the deployments API. A new surfacing (which also brings in the new GPS
+    fixes for the track) or the deployment ending changes the fingerprint.
+    :param deployment_api: deployment record from the deployments API
+    :param settings: anything else the rendered kml depends on (e.g. glider_tail, simplify_tolerance), must be JSON
+        serializable
+    :returns dictionary
+    """
+    ls = deployment_api['last_surfacing']
+    return dict(
+        surfacing_id=ls['surfacing_id'],
+        connect_time_epoch=ls['connect_time_epoch'],
+        end_date_epoch=deployment_api.get('end_date_epoch'),
+        settings=settings
+    )
+
+
+def fragment_file(fragment_dir, deployment_name):
+    return os.path.join(fragment_dir, f'{deployment_name}.json')
+
+
+def load_fragments(fragment_dir, deployment_name, fingerprint, kml_types, max_age_hours=6):
+    """
+    Load the saved <Folder> of a deployment for each kml type if the deployment hasn't changed
+    :param fragment_dir: directory of the saved fragments
+    :param deployment_name: deployment name
+    :param fingerprint: current fingerprint of the deployment (see deployment_fingerprint)
+    :param kml_types: list of kml types needed
+    :param max_age_hours: don't reuse fragments rendered longer ago than this, so the parts of the kml that depend on
+        the current time (e.g. the Last 24 Hours folder, days deployed) don't get too far behind
+    :returns list of the saved fragments in the same order as kml_types, or None if they need to be rendered again
+    """
+    try:
+        with open(fragment_file(fragment_dir, deployment_name), encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if saved.get('fingerprint') != fingerprint:
+        return None
+    fragments = []
+    for kt in kml_types:
+        try:
+            fragment = saved['fragments'][kt]
+        except KeyError:
+            return None
+        if time.time() - fragment['rendered'] > max_age_hours * 3600:
+            return None
+        fragments.append(fragment['kml'])
+    return fragments
+
+
+def save_fragments(fragment_dir, deployment_name, fingerprint, kml_types, fragments):
+    """
+    Save the rendered <Folder> of a deployment for each kml type along with its fingerprint. Saved fragments for other
+    kml types are kept if the deployment hasn't changed.
+    :param fragment_dir: directory of the saved fragments
+    :param deployment_name: deployment name
+    :param fingerprint: fingerprint of the deployment (see deployment_fingerprint)
+    :param kml_types: list of kml types
+    :param fragments: list of the rendered fragments in the same order as kml_types
+    """
+    os.makedirs(fragment_dir, exist_ok=True)
+    saved = dict(
+        fingerprint=fingerprint,
+        fragments=dict()
+    )
+    try:
+        with open(fragment_file(fragment_dir, deployment_name), encoding='utf-8') as f:
+            previous = json.load(f)
+        if previous.get('fingerprint') == fingerprint:
+            saved['fragments'] = previous['fragments']
+    except (OSError, ValueError, KeyError):
+        pass
+    rendered = time.time()
+    for kt, fragment in zip(kml_types, fragments):
+        saved['fragments'][kt] = dict(kml=fragment, rendered=rendered)
+
+    savefile = fragment_file(fragment_dir, deployment_name)
+    fd, tmpfile = tempfile.mkstemp(dir=fragment_dir, prefix=f'.{deployment_name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode='w', encoding='utf-8') as f:
+            json.dump(saved, f)
+        os.replace(tmpfile, savefile)
+    except BaseException:
+        os.remove(tmpfile)
+        raise
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+"""
+Client for the RUCOOL glider API. All requests go through one keep-alive requests.Session so a run reuses a small
+pool of connections, and every request has a timeout and retries with exponential backoff. Responses are decoded by
+json_decode: tracks are decoded straight into numpy columns (track_columns), everything else uses the fastest json
+backend that's installed.
+"""
+
+import numpy as np
+import requests
+from gliderkmz import json_decode, profiling
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+GLIDER_API = 'https://marine.rutgers.edu/cool/data/gliders/api/'
+
+# (connect, read) timeouts in seconds for each endpoint. tracks and surfacings return the entire deployment history
+# so they get a longer read timeout
+TIMEOUTS = dict(
+    deployments=(5, 30),
+    sensors=(5, 60),
+    tracks=(5, 120),
+    surfacings=(5, 120)
+)
+
+
+class GliderAPI:
+    """
+    Keep-alive session for the glider API with connection pooling, per-endpoint timeouts and retries
+    :param base_url: glider API url
+    :param timeouts: optional dictionary of (connect, read) timeouts in seconds to override the defaults in TIMEOUTS
+    :param retries: number of times to retry a request that fails to connect, times out, or returns a 429/5xx status
+    :param backoff_factor: retries sleep for backoff_factor * 2 ** (retry number - 1) seconds between attempts
+    :param pool_maxsize: maximum number of connections kept open to the API, should be >= the number of threads
+        making requests at the same time
+    """
+    def __init__(self, base_url=GLIDER_API, timeouts=None, retries=3, backoff_factor=1, pool_maxsize=10):
+        self.base_url = base_url
+        self.timeouts = dict(TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET'])
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def get(self, endpoint, query='', decode=None):
+        """
+        Request an endpoint from the glider API and return the decoded json
+        :param endpoint: API endpoint, e.g. 'deployments', 'sensors', 'tracks' or 'surfacings'
+        :param query: query string, e.g. 'deployment=ru40-20240215T1642'
+        :param decode: optional function to decode the response body as it's streamed, it's called with a binary
+            file-like object (e.g. json_decode.track_columns). By default the whole body is read and decoded.
+        """
+        with profiling.stage(f'api {endpoint}'):
+            response = self.session.get(f'{self.base_url}{endpoint}/?{query}', timeout=self.timeouts[endpoint],
+                                        stream=decode is not None)
+        # closing the response releases the connection back to the pool, including a streamed response that's never
+        # read because of an error status
+        with response:
+            response.raise_for_status()
+            if decode is None:
+                with profiling.stage('json decode'):
+                    return json_decode.loads(response.content)
+            # the body is read while it's decoded, so this includes the time to download it
+            with profiling.stage('json decode'):
+                response.raw.decode_content = True
+                return decode(response.raw)
+
+    def active_deployments(self):
+        return self.get('deployments', 'active')['data']
+
+    def deployments(self, t0=None, t1=None):
+        """
+        Request all of the deployments (active and recovered) that were in the water at any time between t0 and t1
+        :param t0: optional start time (seconds since 1970-01-01)
+        :param t1: optional end time (seconds since 1970-01-01)
+        """
+        records = self.get('deployments', time_filter(t0, t1).lstrip('&'))['data']
+        return [d for d in records if overlaps(d, t0, t1)]
+
+    def deployment(self, deployment_name):
+        return self.get('deployments', f'deployment={deployment_name}')['data'][0]
+
+    def sensor(self, deployment_name, sensor, t0=None, t1=None):
+        query = f'deployment={deployment_name}&sensor={sensor}{time_filter(t0, t1)}'
+        return filter_records(self.get('sensors', query)['data'], 'epoch_seconds', t0, t1)
+
+    def tracks(self, deployment_name, t0=None, t1=None):
+        features = self.get('tracks', f'deployment={deployment_name}{time_filter(t0, t1)}')['features']
+        if t0 is None and t1 is None:
+            return features
+        # only Point features have a timestamp to filter on
+        return [tf for tf in features
+                if tf['geometry']['type'] == 'Point' and in_window(tf['properties']['gps_epoch'], t0, t1)]
+
+    def track_columns(self, deployment_name, t0=None, t1=None):
+        """
+        Request the track of a deployment and decode the Point features straight into columns (see
+        json_decode.track_columns), without building the GeoJSON features
+        :returns dictionary of numpy arrays gps_epoch, lon, lat and sid
+        """
+        columns = self.get('tracks', f'deployment={deployment_name}{time_filter(t0, t1)}',
+                           decode=json_decode.track_columns)
+        return filter_columns(columns, 'gps_epoch', t0, t1)
+
+    def surfacings(self, deployment_name, t0=None, t1=None):
+        query = f'deployment={deployment_name}{time_filter(t0, t1)}'
+        return filter_records(self.get('surfacings', query)['data'], 'connect_time_epoch', t0, t1)
+
+
+def filter_columns(columns, epoch_column, t0=None, t1=None):
+    """
+    Keep the rows of a dictionary of numpy arrays with columns[epoch_column] between t0 and t1 (inclusive)
+    """
+    if t0 is None and t1 is None:
+        return columns
+    epochs = columns[epoch_column]
+    keep = np.ones(len(epochs), dtype='bool')
+    if t0 is not None:
+        keep &= epochs >= t0
+    if t1 is not None:
+        keep &= epochs <= t1
+    return {col: values[keep] for col, values in columns.items()}
+
+
+def filter_records(records, epoch_key, t0=None, t1=None):
+    """
+    Keep the records with record[epoch_key] between t0 and t1 (inclusive)
+    """
+    if t0 is None and t1 is None:
+        return records
+    return [r for r in records if in_window(r[epoch_key], t0, t1)]
+
+
+def in_window(epoch, t0=None, t1=None):
+    """
+    Check if a time is between t0 and t1 (inclusive), either bound can be None
+    """
+    return (t0 is None or epoch >= t0) and (t1 is None or epoch <= t1)
+
+
+def overlaps(deployment_api, t0=None, t1=None):
+    """
+    Check if a deployment was in the water at any time between t0 and t1, either bound can be None. Active
+    deployments don't have an end date yet.
+    """
+    end = deployment_api.get('end_date_epoch')
+    return (t1 is None or deployment_api['start_date_epoch'] <= t1) and (t0 is None or end is None or end >= t0)
+
+
+def time_filter(t0=None, t1=None):
+    """
+    Build the query string for a time window (seconds since 1970-01-01). Responses are also filtered after they're
+    returned, so the results are the same whether or not the API applies the filter.
+    """
+    query = ''
+    if t0 is not None:
+        query = f'{query}&start_epoch={int(t0)}'
+    if t1 is not None:
+        query = f'{query}&end_epoch={int(t1)}'
+    return query
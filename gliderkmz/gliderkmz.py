@@ -0,0 +1,1205 @@
+#!/usr/bin/env python
+
+"""
+Author: lgarzio on 2/28/2024
+Last modified: lgarzio on 3/13/2024
+Test glider kmz generation
+"""
+
+import os
+import collections
+import contextlib
+import datetime as dt
+import functools
+import io
+import itertools
+import tempfile
+import zipfile
+import numpy as np
+import yaml
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from gliderkmz import json_decode, profiling
+from gliderkmz.deployment_cache import DeploymentCache
+from gliderkmz.fragment_cache import deployment_fingerprint, load_fragments, save_fragments
+from gliderkmz.glider_api import GliderAPI
+from gliderkmz.kinematics import current_arrows, dive_kinematics, surfacing_gps_fixes
+from gliderkmz.kml_templates import TEMPLATE_DIR, get_template
+from gliderkmz.regionate import LOD_PIXELS, TILE_SURFACINGS, bounding_box, coarse_track, split_tiles
+from gliderkmz.track_simplify import simplify_track
+# pandas is imported in the functions that process the deployment data, so runs that don't process any data (e.g.
+# when the saved kml is reused for every deployment) don't wait for it to load
+
+SURFACE_EVENT_FIELDS = ['connect_ts', 'connect_ts_Z', 'gps_lat_degrees', 'gps_lon_degrees', 'style_name']
+CURRENTS_FIELDS = ['connect_HHMM', 'connect_ts_Z', 'lon_degrees_start', 'lat_degrees_start', 'lon_degrees_end',
+                   'lat_degrees_end']
+CURRENT_SENSORS = ['m_water_vx', 'm_water_vy']  # depth-averaged current (m/s) calculated by the glider when it surfaces
+SENSOR_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'configs', 'sensor_thresholds.yml')
+
+
+class RecordColumns:
+    """
+    Dictionary-like view of {row number: record} over columns of data, used in place of a dictionary of records in the
+    kml templates. The dictionary for each record is only built when the template iterates over the records.
+    :param columns: dictionary of {column name: list of values}
+    :param rows: row numbers of the records
+    :param fields: columns included in each record
+    :param nested: optional dictionary of {field name: list of columns} for fields that hold a dictionary of more
+        columns (e.g. the information for the pop-up text boxes)
+    """
+    def __init__(self, columns, rows, fields, nested=None):
+        self.columns = columns
+        self.rows = rows
+        self.fields = fields
+        self.nested = nested or dict()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def items(self):
+        for row in self.rows:
+            record = {field: self.columns[field][row] for field in self.fields}
+            for field, nested_fields in self.nested.items():
+                record[field] = {nf: self.columns[nf][row] for nf in nested_fields}
+            yield row, record
+
+
+def add_sensor_values(data_dict, sensor_name, sdf, thresholds=None):
+    """
+    Find data from a sensor within a specific time range (+/- 5 minutes from surface disconnect time). Add the median
+    of the values to the dictionary summaries
+    :param thresholds: dictionary of fail_threshold and suspect_span for the sensor, defaults to the thresholds for
+        sensor_name in the packaged configs/sensor_thresholds.yml
+    """
+    import pandas as pd
+
+    if thresholds is None:
+        thresholds = load_sensor_thresholds()[sensor_name]
+
+    disconnect_epoch = pd.Timestamp(data_dict['disconnect_ts']).timestamp()
+    sensor_values, bgcolors = sensor_window_medians(sdf, [disconnect_epoch], thresholds)
+    data_dict[sensor_name] = None if np.isnan(sensor_values[0]) else sensor_values[0]
+    data_dict[f'{sensor_name}_bgcolor'] = bgcolors[0]
+
+
+def build_deployment_dict(gd_api, ts_now, glider_tail, sensor_list, sensor_thresholds, simplify_tolerance=None):
+    """
+    Build the dictionary of all of the information that populates one deployment in the kml template. The same
+    dictionary is used to render every kml type. The track and surfacings are kept as compact columns of their raw
+    values (numpy arrays), they're formatted for the templates when the deployment is rendered (see render_deployment).
+    :param gd_api: dictionary of API responses for the deployment (see fetch_deployments)
+    :param ts_now: formatted timestamp of the kml generation time
+    :param glider_tail: url or kmz path of the glider tail image
+    :param sensor_list: list of surface sensors to add to the pop-up text boxes
+    :param sensor_thresholds: dictionary of sensor thresholds (see load_sensor_thresholds)
+    :param simplify_tolerance: optional tolerance in meters to simplify the track before it's rendered
+    """
+    import pandas as pd
+
+    deployment_api = gd_api['deployment']
+
+    glider_name = deployment_api['glider_name']
+    deployment_name = deployment_api['deployment_name']
+
+    # get distance flow and calculate days deployed
+    distance_flown_km = deployment_api['distance_flown_km']
+    try:
+        end = dt.datetime.fromtimestamp(deployment_api['end_date_epoch'], dt.UTC)
+    except TypeError:
+        end = dt.datetime.now(dt.UTC)
+    start = dt.datetime.fromtimestamp(deployment_api['start_date_epoch'], dt.UTC)
+    seconds_deployed = ((end - start).days * 86400) + (end - start).seconds
+    days_deployed = np.round(seconds_deployed / 86400, 2)
+
+    # grab the data from the surface sensors and store in a dictionary (so you only have to hit the API once
+    # per sensor per deployment)
+    with profiling.stage('sensor data', deployment_name):
+        sensor_data = dict()
+        for sensor in sensor_list + CURRENT_SENSORS:
+            # only the time and value are used, naming the columns also keeps them when there aren't any data
+            sensor_df = pd.DataFrame(gd_api['sensors'][sensor], columns=['epoch_seconds', 'value'])
+            sensor_df.sort_values(by='epoch_seconds', inplace=True, ignore_index=True)
+            sensor_data[sensor] = sensor_df
+
+    # build the dictionary for the last surfacing information
+    ls_api = deployment_api['last_surfacing']
+    last_surfacing_popup_dict = build_popup_dict(ls_api)
+    ls_gps_lat_degrees = ls_api['gps_lat_degrees']
+    ls_gps_lon_degrees = ls_api['gps_lon_degrees']
+
+    # add values for battery and vacuum to the last surfacing information
+    for sensor in sensor_list:
+        add_sensor_values(last_surfacing_popup_dict, sensor, sensor_data[sensor], sensor_thresholds[sensor])
+
+    # add dive information (time, distance, speed)
+    last_surfacing_popup_dict['dive_time'] = int(np.round(ls_api['dive_time_seconds'] / 60))  # minutes
+    last_surfacing_popup_dict['dive_dist'] = np.round(ls_api['segment_distance_m'] / 1000, 2)  # km
+    last_surfacing_popup_dict['total_speed'] = None  # m/s
+    last_surfacing_popup_dict['total_speed_bearing'] = None
+    last_surfacing_popup_dict['current_speed'] = None  # m/s
+    last_surfacing_popup_dict['current_speed_bearing'] = None
+    last_surfacing_popup_dict['glide_speed'] = None  # m/s
+    last_surfacing_popup_dict['glide_speed_bearing'] = None
+
+    # current waypoint information
+    cwpt_lat = ls_api['waypoint_lat']
+    cwpt_lon = ls_api['waypoint_lon']
+    cwpt_lat_degress = convert_nmea_degrees(cwpt_lat)
+    cwpt_lon_degress = convert_nmea_degrees(cwpt_lon)
+
+    # track information
+    # gather track timestamp and location from the API, and add the last surfacing
+    with profiling.stage('track build', deployment_name):
+        track_df = build_track_df(gd_api['tracks'], ls_api)
+
+        # find the deployment id
+        deployment_sid = int(track_df.iloc[0]['sid'])
+
+        # first and last GPS fix of each surfacing for the dive kinematics, from the full track before it's
+        # simplified
+        gps_fixes = surfacing_gps_fixes(track_df['sid'], track_df['gps_epoch'], track_df['lon'], track_df['lat'],
+                                        [se['surfacing_id'] for se in gd_api['surfacings']])
+
+        # simplify the track so long deployments don't put every GPS fix in the kml
+        if simplify_tolerance:
+            track_points = len(track_df)
+            track_df = simplify_track(track_df, simplify_tolerance)
+            print(f'{glider_name}: track simplified from {track_points} to {len(track_df)} points')
+
+        # only the times and locations are kept, the track line and segments are built when the kml is rendered
+        track = {col: track_df[col].to_numpy() for col in ['gps_epoch', 'lon', 'lat']}
+
+    # surface events: build the information for all of the surfacings at once, as columns
+    with profiling.stage('surfacing processing', deployment_name):
+        surface_events = gd_api['surfacings']
+        surfacings = build_surfacing_columns(surface_events)
+        call_length_seconds = sum(se['call_length_seconds'] for se in surface_events)
+
+        # calculate previous 24 hours
+        t24h = pd.to_datetime(ts_now) - pd.Timedelta(hours=24)
+
+        # define surfacing grouping (e.g. last 24 hours or day) and folder names for depth-average currents
+        se_ts = epochs_to_datetime(surfacings['connect_time_epoch']).floor('min').tz_localize(None)
+        recent = np.asarray(se_ts >= t24h)
+        currents_folder_names = se_ts.strftime('%Y-%m-%d').tolist()
+        folder_names = np.where(recent, 'Last 24 Hours', currents_folder_names).tolist()
+        surfacings['recent'] = recent
+
+        # add data from sensors to the popups, the battery and vacuum values for all of the surfacings are found at
+        # once. The glider calculates the depth-averaged current of the dive when it surfaces, so the current for each
+        # dive is the value at the end of the surfacing that follows it.
+        with profiling.stage('sensor windows', deployment_name):
+            for sensor in sensor_list:
+                surfacings[sensor], surfacings[f'{sensor}_bgcolor'] = sensor_window_medians(
+                    sensor_data[sensor], surfacings['disconnect_time_epoch'], sensor_thresholds[sensor]
+                )
+            current_u, current_v = (sensor_window_medians(sensor_data[sensor], surfacings['disconnect_time_epoch'])[0]
+                                    for sensor in CURRENT_SENSORS)
+
+        # calculate the dive kinematics. Each dive goes from the last GPS fix of the previous surfacing to the first
+        # GPS fix of this surfacing (the surfacing's GPS position is used if there are no track points for it). The
+        # glide speed is the speed over ground minus the measured current, both are left out for dives without it.
+        n = len(surface_events)
+        order = np.argsort(surfacings['connect_time_epoch'], kind='stable')
+        has_previous = np.zeros(n, dtype='bool')
+        has_previous[order[1:]] = True
+        previous = np.zeros(n, dtype='int')
+        previous[order[1:]] = order[:-1]
+
+        gps_epoch = surfacings['gps_timestamp_epoch']
+        gps_lon = surfacings['gps_lon_degrees']
+        gps_lat = surfacings['gps_lat_degrees']
+        fixes = dict()
+        for which in ['first', 'last']:
+            for field, fallback in [('epoch', gps_epoch), ('lon', gps_lon), ('lat', gps_lat)]:
+                values = gps_fixes[f'{which}_{field}']
+                fixes[f'{which}_{field}'] = np.where(np.isnan(values), fallback, values)
+
+        def from_previous(values):
+            return np.where(has_previous, values[previous], np.nan)
+
+        kinematics = dive_kinematics(
+            from_previous(fixes['last_epoch']), from_previous(fixes['last_lon']), from_previous(fixes['last_lat']),
+            fixes['first_epoch'], fixes['first_lon'], fixes['first_lat'], current_u, current_v
+        )
+
+        # add dive information to the surfacing events (time, distance, speed)
+        surfacings['dive_time'] = kinematics['dive_time'] / 60  # minutes
+        surfacings['dive_dist'] = kinematics['distance'] / 1000  # km
+        for speed in ['total', 'current', 'glide']:
+            surfacings[f'{speed}_speed'] = kinematics[f'{speed}_speed']  # m/s
+            surfacings[f'{speed}_speed_bearing'] = kinematics[f'{speed}_bearing']
+        dive_fields = ['dive_time', 'dive_dist', 'total_speed', 'total_speed_bearing', 'current_speed',
+                       'current_speed_bearing', 'glide_speed', 'glide_speed_bearing']
+
+        # depth-averaged current arrows show 1 day of drift from the surfacing location
+        lon_end, lat_end = current_arrows(gps_lon, gps_lat, kinematics['current_u'], kinematics['current_v'])
+        surfacings['lon_degrees_end'] = np.round(lon_end, 5)
+        surfacings['lat_degrees_end'] = np.round(lat_end, 5)
+        valid_currents = np.flatnonzero(~np.isnan(kinematics['current_u'])).tolist()
+        if n > 0 and len(valid_currents) == 0:
+            print(f'{glider_name}: no depth-averaged current data ({", ".join(CURRENT_SENSORS)}), the current arrows '
+                  f'and glide speeds are left out')
+
+
+        # the values are formatted and the records for each folder are built when the kml is rendered, only the row
+        # numbers of the surfacings in each folder are kept until then
+        popup_fields = ['connect_ts', 'disconnect_ts', 'gps_lat', 'gps_lon', 'gps_connect_ts', 'gps_bgcolor', 'reason',
+                        'mission', 'filename', 'filename_8x3', 'dsvr_log', 'segment_ewo', 'mission_ewo', 'total_ewo',
+                        'waypoint_lat', 'waypoint_lon', 'waypoint_range', 'waypoint_bearing'] + \
+            [f'{sensor}{suffix}' for sensor in sensor_list for suffix in ['', '_bgcolor']] + dive_fields
+        surface_event_rows = {folder_name: np.array(rows, dtype='int32')
+                              for folder_name, rows in group_rows(folder_names).items()}
+        currents_rows = {folder_name: np.array(rows, dtype='int32')
+                         for folder_name, rows in group_rows(currents_folder_names, valid_currents).items()}
+
+    # find the deployment location surface record  ***** this doesn't match up with the current kmzs *****
+    deployment_idx = [idx for idx, sid in enumerate(surfacings['surfacing_id']) if sid == deployment_sid]
+    if len(deployment_idx) > 0:
+        deployment_idx = deployment_idx[-1]
+    else:
+        # the first track point's surfacing isn't in the surfacings, use the first surfacing instead
+        deployment_idx = int(np.argmin(surfacings['connect_time_epoch']))
+        print(f'{glider_name}: surfacing {deployment_sid} of the first GPS fix not found, using the first surfacing '
+              f'for the deployment location')
+    se = surface_events[deployment_idx]
+    deployment_record = format_surfacing_columns(surfacings, [deployment_idx])
+
+    # build the dictionary for the deployment information
+    deployment_popup_dict = build_popup_dict(se)
+    deployment_ts_Z = deployment_record['connect_ts_Z'][0]
+    deployment_gps_lat_degrees = se['gps_lat_degrees']
+    deployment_gps_lon_degrees = se['gps_lon_degrees']
+
+    # add values for battery and vacuum to deployment information
+    for sensor in sensor_list:
+        deployment_popup_dict[sensor] = deployment_record[sensor][0]
+        deployment_popup_dict[f'{sensor}_bgcolor'] = deployment_record[f'{sensor}_bgcolor'][0]
+
+    # add dive information (time, distance, speed)
+    for field in dive_fields:
+        deployment_popup_dict[field] = deployment_record[field][0]
+
+    # add speeds to the last surfacing information if it's one of the surfacings (the dive time and distance are
+    # already there, from the API)
+    ls_idx = [idx for idx, sid in enumerate(surfacings['surfacing_id']) if sid == ls_api['surfacing_id']]
+    ls_record = format_surfacing_columns(surfacings, ls_idx[-1:]) if len(ls_idx) > 0 else None
+    for field in dive_fields[2:]:
+        last_surfacing_popup_dict[field] = ls_record[field][0] if ls_record is not None else None
+
+    deployment_dict = dict(
+        ts_now=ts_now,
+        deployment_name=deployment_name,
+        glider_name=glider_name,
+        glider_tail=glider_tail,
+        ls_connect_ts=last_surfacing_popup_dict['connect_ts'],
+        deploy_ts_Z=deployment_ts_Z,
+        ls_gps_lat_degrees=ls_gps_lat_degrees,
+        ls_gps_lon_degrees=ls_gps_lon_degrees,
+        last_surfacing_popup=last_surfacing_popup_dict,
+        deploy_connect_ts=deployment_popup_dict['connect_ts'],
+        deploy_gps_lat_degrees=deployment_gps_lat_degrees,
+        deploy_gps_lon_degrees=deployment_gps_lon_degrees,
+        deployment_popup=deployment_popup_dict,
+        cwpt_since=last_surfacing_popup_dict['disconnect_ts'],
+        cwpt_lat=cwpt_lat,
+        cwpt_lon=cwpt_lon,
+        cwpt_lat_degrees=cwpt_lat_degress,
+        cwpt_lon_degrees=cwpt_lon_degress,
+        distance_flown_km=distance_flown_km,
+        days_deployed=days_deployed,
+        iridium_mins=int(np.round(call_length_seconds / 60)),
+        track=track,
+        surfacing_columns=surfacings,
+        surface_event_rows=surface_event_rows,
+        surface_event_popup_fields=popup_fields,
+        currents_rows=currents_rows
+    )
+
+    return deployment_dict
+
+
+def build_popup_dict(data):
+    """
+    Build the dictionaries for the data that populates the pop-up text boxes
+    :param data: dictionary
+    """
+    connect_ts = format_ts_epoch(data['connect_time_epoch'])
+    disconnect_ts = format_ts_epoch(data['disconnect_time_epoch'])
+    gps_connect_ts = format_ts_epoch(data['gps_timestamp_epoch'])
+
+    gps_connect_timedelta = dt.datetime.fromtimestamp(data['connect_time_epoch'], dt.UTC) - dt.datetime.fromtimestamp(data['gps_timestamp_epoch'], dt.UTC)
+    if gps_connect_timedelta.seconds >= 3600:  # 3600 = 1 hour
+        gps_bgcolor = 'darkred'
+    elif 3600 > gps_connect_timedelta.seconds > 600:  # between 10 mins (600) and 1 hour (3600)
+        gps_bgcolor = 'BEA60E'  # yellow BEA60E
+    else:  # < 10 minutes
+        gps_bgcolor = 'green'
+
+    try:
+        waypoint_range_km = data['waypoint_range_meters'] / 1000
+    except TypeError:
+        waypoint_range_km = None
+
+    popup_dict = dict(
+        connect_ts=connect_ts,
+        disconnect_ts=disconnect_ts,
+        gps_lat=np.round(convert_nmea_degrees(data['gps_lat']), 2),
+        gps_lon=np.round(convert_nmea_degrees(data['gps_lon']), 2),
+        gps_connect_ts=gps_connect_ts,
+        gps_bgcolor=gps_bgcolor,
+        reason=data['surface_reason'],
+        mission=data['mission'],
+        filename=data['filename'],
+        filename_8x3=data['the8x3_filename'],
+        dsvr_log=data['dsvr_log_name'],
+        segment_ewo=f"{data['segment_errors']}/{data['segment_warnings']}/{data['segment_oddities']}",
+        mission_ewo=f"{data['mission_errors']}/{data['mission_warnings']}/{data['mission_oddities']}",
+        total_ewo=f"{data['total_errors']}/{data['total_warnings']}/{data['total_oddities']}",
+        waypoint_lat=data['waypoint_lat'],
+        waypoint_lon=data['waypoint_lon'],
+        waypoint_range=waypoint_range_km,
+        waypoint_bearing=data['waypoint_bearing_degrees']
+    )
+
+    return popup_dict
+
+
+def build_surfacing_columns(records):
+    """
+    Build compact columns of the surfacing information for a list of records at once. Only the raw values are kept
+    until the kml is rendered, see format_surfacing_columns for the values shown in the pop-up text boxes.
+    :param records: list of dictionaries, e.g. the surfacings from the API
+    :returns dictionary of {column name: numpy array}: times, positions and numbers as float arrays, and the text and
+        values that are shown as they come from the API as object arrays
+    """
+    def column(key, dtype=object):
+        return np.array([r.get(key) for r in records], dtype=dtype)
+
+    columns = dict(surfacing_id=column('surfacing_id'))
+    for key in ['connect_time_epoch', 'disconnect_time_epoch', 'gps_timestamp_epoch', 'gps_lat_degrees',
+                'gps_lon_degrees']:
+        columns[key] = column(key, 'float')
+
+    # seconds part of the time between the GPS fix and connecting (the same as timedelta.seconds)
+    connect_us = np.round(columns['connect_time_epoch'] * 1e6)
+    gps_us = np.round(columns['gps_timestamp_epoch'] * 1e6)
+    columns['gps_connect_seconds'] = ((connect_us - gps_us) // 1e6) % 86400
+
+    columns['gps_lat'] = np.round(convert_nmea_degrees(column('gps_lat', 'float')), 2)
+    columns['gps_lon'] = np.round(convert_nmea_degrees(column('gps_lon', 'float')), 2)
+    for field, key in [('reason', 'surface_reason'), ('mission', 'mission'), ('filename', 'filename'),
+                       ('filename_8x3', 'the8x3_filename'), ('dsvr_log', 'dsvr_log_name'),
+                       ('waypoint_lat', 'waypoint_lat'), ('waypoint_lon', 'waypoint_lon'),
+                       ('waypoint_bearing', 'waypoint_bearing_degrees')]:
+        columns[field] = column(key)
+    for ewo in ['segment', 'mission', 'total']:
+        for count in ['errors', 'warnings', 'oddities']:
+            columns[f'{ewo}_{count}'] = column(f'{ewo}_{count}')
+    columns['waypoint_range'] = column('waypoint_range_meters', 'float') / 1000
+
+    return columns
+
+
+def build_track_df(track, last_surfacing):
+    """
+    Build the dataframe of glider track timestamps and locations from the tracks API, and add the last surfacing.
+    :param track: dictionary of numpy arrays gps_epoch, lon, lat and sid decoded from the tracks API (see
+        GliderAPI.track_columns), or the list of GeoJSON features from the tracks API
+    :param last_surfacing: dictionary containing the last surfacing information from the deployments API
+    :returns dataframe with columns gps_epoch, lon, lat and sid, sorted by time
+    """
+    import pandas as pd
+
+    if not isinstance(track, dict):
+        track = json_decode.feature_columns(track)
+
+    # add the last surfacing to the track
+    track_df = pd.DataFrame(dict(
+        gps_epoch=np.append(track['gps_epoch'], last_surfacing['connect_time_epoch']),
+        lon=np.append(track['lon'], np.array(last_surfacing['gps_lon_degrees'], dtype='float')),
+        lat=np.append(track['lat'], np.array(last_surfacing['gps_lat_degrees'], dtype='float')),
+        sid=np.append(track['sid'], last_surfacing['surfacing_id'])
+    ))
+    track_df.sort_values(by='gps_epoch', inplace=True, ignore_index=True)
+
+    return track_df
+
+
+def build_track_segments(track_df):
+    """
+    Build the start/end times and locations of each segment between consecutive track points for the time-enabled
+    kmls. The timestamps are formatted once for the whole track and then shifted, instead of row by row.
+    :param track_df: dataframe (or dictionary of arrays) of the track gps_epoch, lon and lat, sorted by time (see
+        build_track_df)
+    :returns dictionary of equal-length lists: start, end, start_lon, start_lat, end_lon, end_lat
+    """
+    import pandas as pd
+
+    track_ts = pd.to_datetime(np.asarray(track_df['gps_epoch']), unit='s', utc=True).strftime('%Y-%m-%dT%H:%M:%SZ')
+    track_ts = track_ts.tolist()
+    track_lon = track_df['lon'].tolist()
+    track_lat = track_df['lat'].tolist()
+
+    track_segments = dict(
+        start=track_ts[:-1],
+        end=track_ts[1:],
+        start_lon=track_lon[:-1],
+        start_lat=track_lat[:-1],
+        end_lon=track_lon[1:],
+        end_lat=track_lat[1:]
+    )
+
+    return track_segments
+
+
+def convert_nmea_degrees(x):
+    """
+    Convert lat/lon coordinates from nmea to decimal degrees
+    """
+    try:
+        degrees = np.sign(x) * (np.floor(np.abs(x)/100) + np.mod(np.abs(x), 100) / 60)
+    except TypeError:
+        degrees = None
+
+    return degrees
+
+
+def encode_coordinates(lon, lat, height=4.999999999999999, precision=None):
+    """
+    Build the kml <coordinates> string for a LineString directly from the lon/lat arrays
+    :param lon: array of longitudes (decimal degrees)
+    :param lat: array of latitudes (decimal degrees)
+    :param height: altitude added to every coordinate
+    :param precision: optional number of decimal places for lon/lat, by default the shortest representation that
+        round-trips each value is used (the same as simplekml)
+    :returns string of lon,lat,height tuples separated by spaces
+    """
+    if precision is None:
+        lon_str = map(repr, np.asarray(lon, dtype='float').tolist())
+        lat_str = map(repr, np.asarray(lat, dtype='float').tolist())
+    else:
+        lon_str = np.char.mod(f'%.{precision}f', np.asarray(lon, dtype='float'))
+        lat_str = np.char.mod(f'%.{precision}f', np.asarray(lat, dtype='float'))
+    height_str = repr(float(height))
+
+    return ' '.join(f'{x},{y},{height_str}' for x, y in zip(lon_str, lat_str))
+
+
+def epochs_to_datetime(epochs):
+    """
+    Convert times in seconds since 1970-01-01 to UTC datetimes, rounded to the microsecond like
+    datetime.fromtimestamp
+    :param epochs: array of times (seconds since 1970-01-01)
+    :returns pandas DatetimeIndex
+    """
+    import pandas as pd
+
+    microseconds = np.round(np.asarray(epochs, dtype='float') * 1e6).astype('int64')
+    return pd.to_datetime(microseconds, unit='us', utc=True)
+
+
+def fetch_deployments(api, deployments, sensor_list, max_workers=8, t0=None, t1=None):
+    """
+    Grab the sensor, track and surfacing information for each deployment from the glider API. Every endpoint request
+    is submitted to a thread pool so the requests for multiple deployments run concurrently. Deployments are fetched
+    at most max_workers ahead of the one being processed, so only a few deployments' data are held in memory at once.
+    :param api: GliderAPI client (or DeploymentCache)
+    :param deployments: list of deployment records from the deployments API
+    :param sensor_list: list of surface sensors to grab for each deployment, the depth-averaged current
+        (CURRENT_SENSORS) is always grabbed too
+    :param max_workers: maximum number of concurrent API requests
+    :param t0: optional start of the time window for the tracks and surfacings (seconds since 1970-01-01)
+    :param t1: optional end of the time window for the tracks and surfacings (seconds since 1970-01-01). With a time
+        window, the last surfacing in the window replaces the deployment's last surfacing.
+    :returns generator of dictionaries containing the API responses, in the same order as deployments
+    """
+    window = dict() if t0 is None and t1 is None else dict(t0=t0, t1=t1)
+
+    def submit(deployment_api):
+        deployment_name = deployment_api['deployment_name']
+        return dict(
+            deployment=deployment_api,
+            sensors={sensor: executor.submit(profiling.timed, 'fetch sensors', deployment_name, api.sensor,
+                                             deployment_name, sensor)
+                     for sensor in sensor_list + CURRENT_SENSORS},
+            tracks=executor.submit(profiling.timed, 'fetch tracks', deployment_name, api.track_columns,
+                                   deployment_name, **window),
+            surfacings=executor.submit(profiling.timed, 'fetch surfacings', deployment_name, api.surfacings,
+                                       deployment_name, **window)
+        )
+
+    deployments = iter(deployments)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = collections.deque(submit(d) for d in itertools.islice(deployments, max_workers))
+        while len(pending) > 0:
+            f = pending.popleft()
+            gd_api = dict(
+                deployment=f['deployment'],
+                sensors={sensor: sf.result() for sensor, sf in f['sensors'].items()},
+                tracks=f['tracks'].result(),
+                surfacings=f['surfacings'].result()
+            )
+            if window and len(gd_api['surfacings']) > 0:
+                last_surfacing = max(gd_api['surfacings'], key=lambda se: se['connect_time_epoch'])
+                gd_api['deployment'] = dict(gd_api['deployment'], last_surfacing=last_surfacing)
+
+                # the tracks are windowed by GPS time and the surfacings by connect time, so the first GPS fixes in
+                # the window can belong to a surfacing that connected before it. Only keep the track points of the
+                # surfacings in the window so the track and surfacings match.
+                surfacing_ids = [se['surfacing_id'] for se in gd_api['surfacings']]
+                keep = np.isin(gd_api['tracks']['sid'], surfacing_ids)
+                gd_api['tracks'] = {col: values[keep] for col, values in gd_api['tracks'].items()}
+            # start fetching the next deployment before handing this one back
+            pending.extend(submit(d) for d in itertools.islice(deployments, 1))
+            yield gd_api
+
+
+def folder_records(columns, folder_rows, fields, nested=None, keep=None):
+    """
+    Build the records for each folder of surfacings in the kml templates
+    :param columns: dictionary of {field name: list of values} of the formatted surfacings (see
+        format_surfacing_columns)
+    :param folder_rows: dictionary of {folder name: numpy array of the row numbers of the surfacings in the folder}
+    :param fields: list of fields of each record
+    :param nested: optional dictionary of {field name: list of columns} for fields that hold a dictionary of more
+        columns (see RecordColumns)
+    :param keep: optional boolean array, True for the rows to include. Folders without any rows are left out.
+    :returns dictionary of {folder name: RecordColumns}
+    """
+    records = dict()
+    for folder_name, rows in folder_rows.items():
+        if keep is not None:
+            rows = rows[keep[rows]]
+            if len(rows) == 0:
+                continue
+        records[folder_name] = RecordColumns(columns, rows.tolist(), fields=fields, nested=nested)
+    return records
+
+
+def format_surfacing_columns(columns, rows=None):
+    """
+    Format the surfacing columns for the pop-up text boxes and placemarks in the kml templates, for all of the
+    surfacings at once (see build_surfacing_columns)
+    :param columns: dictionary of {column name: numpy array} of the surfacings
+    :param rows: optional list of the row numbers to format, defaults to all rows
+    :returns dictionary of {field name: list of values}, with None for missing values
+    """
+    if rows is not None:
+        columns = {col: values[rows] for col, values in columns.items()}
+
+    formatted = dict()
+    for col, values in columns.items():
+        if values.dtype.kind == 'f':
+            values = np.where(np.isnan(values), None, values)
+        formatted[col] = values.tolist()
+
+    connect_datetime = epochs_to_datetime(columns['connect_time_epoch'])
+    formatted['connect_ts'] = connect_datetime.strftime('%Y-%m-%d %H:%M').tolist()
+    formatted['connect_ts_Z'] = connect_datetime.strftime('%Y-%m-%dT%H:%M:%SZ').tolist()
+    formatted['connect_HHMM'] = connect_datetime.strftime('%H:%M').tolist()
+    for field, epochs in [('disconnect_ts', 'disconnect_time_epoch'), ('gps_connect_ts', 'gps_timestamp_epoch')]:
+        formatted[field] = epochs_to_datetime(columns[epochs]).strftime('%Y-%m-%d %H:%M').tolist()
+    formatted['style_name'] = np.where(columns['recent'], 'RecentSurfacing', 'Surfacing').tolist()
+
+    gps_connect_seconds = columns['gps_connect_seconds']
+    formatted['gps_bgcolor'] = np.select(
+        [gps_connect_seconds >= 3600, gps_connect_seconds > 600],  # 1 hour, 10 minutes
+        ['darkred', 'BEA60E'],  # yellow BEA60E
+        default='green'
+    ).tolist()
+
+    for ewo in ['segment', 'mission', 'total']:
+        counts = zip(*(formatted[f'{ewo}_{count}'] for count in ['errors', 'warnings', 'oddities']))
+        formatted[f'{ewo}_ewo'] = [f'{errors}/{warnings}/{oddities}' for errors, warnings, oddities in counts]
+
+    # dive information (time, distance, speed)
+    formatted['dive_time'] = round_values(columns['dive_time']).tolist()  # minutes
+    formatted['dive_dist'] = round_values(columns['dive_dist'], 2).tolist()  # km
+    for speed in ['total', 'current', 'glide']:
+        formatted[f'{speed}_speed'] = round_values(columns[f'{speed}_speed'], 2).tolist()  # m/s
+        formatted[f'{speed}_speed_bearing'] = round_values(columns[f'{speed}_speed_bearing'], bearing=True).tolist()
+
+    # depth-averaged current arrows start at the surfacing location
+    formatted['lon_degrees_start'] = formatted['gps_lon_degrees']
+    formatted['lat_degrees_start'] = formatted['gps_lat_degrees']
+
+    return formatted
+
+
+def format_ts_epoch(timestamp):
+    return dt.datetime.fromtimestamp(timestamp, dt.UTC).strftime('%Y-%m-%d %H:%M')
+
+
+def group_rows(keys, rows=None):
+    """
+    Find the row numbers for each key, with the keys in the order they first appear
+    :param keys: list of keys, one for each row
+    :param rows: optional list of the row numbers to include, defaults to all rows
+    :returns dictionary of {key: list of row numbers}
+    """
+    if rows is None:
+        rows = range(len(keys))
+    groups = collections.defaultdict(list)
+    for row in rows:
+        groups[keys[row]].append(row)
+    return groups
+
+
+@functools.lru_cache
+def load_sensor_thresholds(yml_file=SENSOR_THRESHOLDS):
+    """
+    Load and validate the sensor thresholds config. The file is only read once per process, every caller shares the
+    same dictionary.
+    :param yml_file: path to the sensor thresholds config, defaults to configs/sensor_thresholds.yml in the package
+    :returns dictionary of {sensor_name: {fail_threshold: value, suspect_span: [min, max]}}
+    """
+    with open(yml_file) as f:
+        sensor_thresholds = yaml.safe_load(f)
+
+    for sensor_name, thresholds in sensor_thresholds.items():
+        try:
+            fail_threshold = float(thresholds['fail_threshold'])
+            suspect_min, suspect_max = (float(x) for x in thresholds['suspect_span'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'{yml_file}: {sensor_name} must have a numeric fail_threshold and a two-value '
+                             f'suspect_span')
+        if suspect_min > suspect_max:
+            raise ValueError(f'{yml_file}: {sensor_name} suspect_span minimum is greater than the maximum')
+        if fail_threshold > suspect_max:
+            raise ValueError(f'{yml_file}: {sensor_name} fail_threshold is greater than the suspect_span maximum')
+
+    return sensor_thresholds
+
+
+@contextlib.contextmanager
+def open_output(savefile, output_format='kml', kmz_files=None):
+    """
+    Open the output file for writing the kml: a .kml file, or doc.kml inside a deflate-compressed .kmz. The file is
+    written to a temporary file in the same directory and renamed to savefile when it's complete, so anything reading
+    savefile never sees a partially written file.
+    :param savefile: output file path
+    :param output_format: 'kml' or 'kmz'
+    :param kmz_files: optional dictionary of {path in the kmz: local file path} of files to bundle in the kmz
+    """
+    fd, tmpfile = tempfile.mkstemp(dir=os.path.dirname(savefile) or '.', prefix=f'.{os.path.basename(savefile)}.',
+                                   suffix='.tmp')
+    os.close(fd)
+    try:
+        if output_format == 'kmz':
+            with zipfile.ZipFile(tmpfile, mode='w', compression=zipfile.ZIP_DEFLATED) as kmz:
+                # doc.kml has to be the first file in the kmz
+                with kmz.open('doc.kml', mode='w') as doc, io.TextIOWrapper(doc, encoding='utf-8') as message:
+                    yield message
+                for arcname, filename in (kmz_files or dict()).items():
+                    # images are already compressed, the kml tiles aren't
+                    compress_type = zipfile.ZIP_DEFLATED if arcname.endswith('.kml') else zipfile.ZIP_STORED
+                    kmz.write(filename, arcname, compress_type=compress_type)
+        else:
+            with open(tmpfile, mode="w", encoding="utf-8") as message:
+                yield message
+        os.chmod(tmpfile, 0o644)
+        os.replace(tmpfile, savefile)
+    except BaseException:
+        os.remove(tmpfile)
+        raise
+
+
+def render_deployment(templatedir, kml_types, deployment_dict):
+    """
+    Render the kml <Folder> for one deployment, for each kml type. Runs in the render worker processes, so each
+    process loads its own copy of the templates.
+    :param templatedir: directory containing the kml templates
+    :param kml_types: list of kml types: 'deployed' 'deployed_ts' 'deployed_uv' 'deployed_ts_uv'
+    :param deployment_dict: dictionary of the deployment information (see build_deployment_dict)
+    :returns list of the rendered <Folder> for each kml type
+    """
+    deployment_macro = get_template('deployment_macro.kml', templatedir).module
+
+    # the track is a single line for the non-time-enabled kmls, and a segment between each point for the time-enabled
+    # kmls
+    track = deployment_dict['track']
+    track_line = None
+    track_segments = None
+    if any(kt in ['deployed', 'deployed_uv'] for kt in kml_types):
+        track_line = encode_coordinates(track['lon'], track['lat'])
+    if any(kt in ['deployed_ts', 'deployed_ts_uv'] for kt in kml_types):
+        # build the start/end times and locations of each track segment to input into the kml template
+        track_segments = build_track_segments(track)
+
+    # format the surfacings once for every kml type, the records are built as the templates iterate over them
+    columns = format_surfacing_columns(deployment_dict['surfacing_columns'])
+    surface_events_dict = folder_records(columns, deployment_dict['surface_event_rows'], SURFACE_EVENT_FIELDS,
+                                         nested=dict(surface_event_popup=deployment_dict['surface_event_popup_fields']))
+    currents_dict = folder_records(columns, deployment_dict['currents_rows'], CURRENTS_FIELDS)
+    deployment_dict = dict(deployment_dict, track_line=track_line, track_segments=track_segments,
+                           surface_event_info=surface_events_dict, currents_info=currents_dict)
+
+    return [str(deployment_macro.build_deployment(kml_type, deployment_dict)) for kml_type in kml_types]
+
+
+def render_document(template, **kwargs):
+    """
+    Render the kml document around the deployment folders
+    :param template: kml document template
+    :param kwargs: template variables
+    :returns the text before and after the deployment folders
+    """
+    marker = '<!-- deployments -->'
+    document_start, document_end = template.render(deployment_fragments=[marker], **kwargs).split(marker)
+    return document_start, document_end
+
+
+def render_regionated_deployment(templatedir, kml_types, deployment_dict, format_info, tile_dirs, tile_hrefs,
+                                 tile_surfacings=TILE_SURFACINGS):
+    """
+    Render the kml <Folder> for one deployment in a regionated kml, for each kml type. The surfacings and track are
+    split into tiles (see regionate.py) that are written to their own kml files, and the <Folder> has a <NetworkLink>
+    to each tile that's only loaded when it's zoomed in. Until then, a simplified track of each tile is shown in the
+    same region, and it's hidden when the tile is loaded.
+    :param templatedir: directory containing the kml templates
+    :param kml_types: list of kml types: 'deployed' 'deployed_ts' 'deployed_uv' 'deployed_ts_uv'
+    :param deployment_dict: dictionary of the deployment information (see build_deployment_dict)
+    :param format_info: dictionary of the style information for each deployment, the deployment's styles are repeated
+        in each tile
+    :param tile_dirs: dictionary of {kml type: directory for the tiles}, the tiles for each deployment are written to
+        a subdirectory named after the deployment
+    :param tile_hrefs: dictionary of {kml type: path of the tile directory relative to the output file}
+    :param tile_surfacings: number of surfacings in each tile
+    :returns list of the rendered <Folder> for each kml type
+    """
+    deployment_macro = get_template('deployment_macro.kml', templatedir).module
+    tile_template = get_template('tile_template.kml', templatedir)
+    deployment_name = deployment_dict['deployment_name']
+    deployment_format = {deployment_name: format_info[deployment_name]}
+    line_types = any(kt in ['deployed', 'deployed_uv'] for kt in kml_types)
+    ts_types = any(kt in ['deployed_ts', 'deployed_ts_uv'] for kt in kml_types)
+
+    track = deployment_dict['track']
+    surfacings = deployment_dict['surfacing_columns']
+    surfacing_tiles, track_slices = split_tiles(surfacings['connect_time_epoch'], track['gps_epoch'], tile_surfacings)
+    columns = format_surfacing_columns(surfacings)
+
+    tiles = []
+    for idx, track_slice in enumerate(track_slices):
+        keep = surfacing_tiles == idx
+        tile_track = {col: values[track_slice] for col, values in track.items()}
+
+        # the region covers the track, surfacings and current arrows in the tile
+        lon = [tile_track['lon'], surfacings['gps_lon_degrees'][keep], surfacings['lon_degrees_end'][keep]]
+        lat = [tile_track['lat'], surfacings['gps_lat_degrees'][keep], surfacings['lat_degrees_end'][keep]]
+        box = bounding_box(np.concatenate(lon), np.concatenate(lat))
+        if box is None:
+            continue
+        epochs = np.concatenate([tile_track['gps_epoch'], surfacings['connect_time_epoch'][keep]]).astype('float')
+        begin, end = epochs_to_datetime([np.nanmin(epochs), np.nanmax(epochs)])
+
+        tile_data = dict(
+            glider_name=deployment_dict['glider_name'],
+            glider_tail=deployment_dict['glider_tail'],
+            track_line=encode_coordinates(tile_track['lon'], tile_track['lat']) if line_types else None,
+            track_segments=build_track_segments(tile_track) if ts_types else None,
+            surface_event_info=folder_records(
+                columns, deployment_dict['surface_event_rows'], SURFACE_EVENT_FIELDS,
+                nested=dict(surface_event_popup=deployment_dict['surface_event_popup_fields']), keep=keep
+            ),
+            currents_info=folder_records(columns, deployment_dict['currents_rows'], CURRENTS_FIELDS, keep=keep)
+        )
+        # the simplified track is shown in the same region as the tile until the tile is loaded
+        coarse = coarse_track(tile_track)
+        tile = dict(
+            name=f'{begin:%Y-%m-%d} to {end:%Y-%m-%d}',
+            begin=f'{begin:%Y-%m-%dT%H:%M:%SZ}',
+            end=f'{end:%Y-%m-%dT%H:%M:%SZ}',
+            box=box,
+            min_lod_pixels=LOD_PIXELS,
+            filename=f'{idx:04d}.kml',
+            coarse_track_line=encode_coordinates(coarse['lon'], coarse['lat']) if line_types else None,
+            coarse_track_segments=build_track_segments(coarse) if ts_types else None
+        )
+        for kt in kml_types:
+            os.makedirs(os.path.join(tile_dirs[kt], deployment_name), exist_ok=True)
+            with open_output(os.path.join(tile_dirs[kt], deployment_name, tile['filename'])) as message:
+                message.write(tile_template.render(kml_type=kt, data=tile_data, format_info=deployment_format,
+                                                   tile_name=tile['name']))
+        tiles.append(tile)
+
+    # remove the tiles left over from a previous run with more of them
+    filenames = set(tile['filename'] for tile in tiles)
+    for kt in kml_types:
+        deployment_dir = os.path.join(tile_dirs[kt], deployment_name)
+        if os.path.isdir(deployment_dir):
+            for filename in os.listdir(deployment_dir):
+                if filename.endswith('.kml') and filename not in filenames:
+                    os.remove(os.path.join(deployment_dir, filename))
+
+    # the simplified track is shown with the tiles, a deployment without any tiles (no valid positions) shows its
+    # simplified track in the usual place
+    track_line = None
+    track_segments = None
+    if len(tiles) == 0:
+        coarse = coarse_track(track)
+        track_line = encode_coordinates(coarse['lon'], coarse['lat']) if line_types else None
+        track_segments = build_track_segments(coarse) if ts_types else None
+    deployment_dict = dict(deployment_dict, track_line=track_line, track_segments=track_segments,
+                           surface_event_info=dict(), currents_info=dict())
+
+    fragments = []
+    for kt in kml_types:
+        kt_tiles = [dict(tile, href=f'{tile_hrefs[kt]}{deployment_name}/{tile["filename"]}') for tile in tiles]
+        fragments.append(str(deployment_macro.build_deployment(kt, dict(deployment_dict, tiles=kt_tiles))))
+    return fragments
+
+
+def round_values(values, decimals=0, bearing=False):
+    """
+    Round values for the pop-up text boxes
+    :param values: array of values
+    :param decimals: number of decimal places, 0 for integers
+    :param bearing: values are bearings in degrees, rounded values of 360 are changed to 0
+    :returns object array of the rounded values, None where the values are nan
+    """
+    values = np.round(np.asarray(values, dtype='float'), decimals)
+    if bearing:
+        values = np.mod(values, 360)
+    valid = ~np.isnan(values)
+    rounded = np.full(len(values), None, dtype=object)
+    rounded[valid] = values[valid].astype('int') if decimals == 0 else values[valid]
+    return rounded
+
+
+def sensor_window_medians(sdf, disconnect_epochs, thresholds=None, window_seconds=300):
+    """
+    Find the median of the sensor data within a time window (+/- 5 minutes) of each surface disconnect time and
+    classify it against the sensor thresholds. The sensor data are sorted by time, so the window bounds for all
+    surfacings are found at once with a binary search instead of masking the whole dataframe for each surfacing.
+    Disconnect times are rounded down to the minute to match the timestamps shown in the pop-up text boxes.
+    :param sdf: sensor dataframe sorted by epoch_seconds
+    :param disconnect_epochs: surface disconnect times (seconds since 1970-01-01)
+    :param thresholds: dictionary of fail_threshold and suspect_span for the sensor, or None to skip the bgcolors
+    :param window_seconds: number of seconds before and after the disconnect time to include
+    :returns array of median sensor values rounded to 2 decimal places (nan if there are no data in the window) and
+        array of bgcolors for the pop-up text boxes (None without thresholds)
+    """
+    disconnect_epochs = np.floor(np.asarray(disconnect_epochs, dtype='float') / 60) * 60
+    sensor_epochs = sdf['epoch_seconds'].to_numpy(dtype='float')
+    values = sdf['value'].to_numpy(dtype='float')
+    i0 = np.searchsorted(sensor_epochs, disconnect_epochs - window_seconds, side='left')
+    i1 = np.searchsorted(sensor_epochs, disconnect_epochs + window_seconds, side='right')
+
+    medians = np.full(len(disconnect_epochs), np.nan)
+    for idx in np.flatnonzero(i1 > i0):
+        medians[idx] = np.median(values[i0[idx]:i1[idx]])
+    medians = np.round(medians, 2)
+    if thresholds is None:
+        return medians, None
+
+    bgcolors = np.select(
+        [medians <= thresholds['fail_threshold'],
+         np.logical_and(thresholds['suspect_span'][0] < medians, medians < thresholds['suspect_span'][1]),
+         np.isnan(medians)],
+        ['darkred', 'BEA60E', 'BEA60E'],  # yellow BEA60E
+        default='green'
+    )
+
+    return medians, bgcolors
+
+
+def main(deployment, kml_type, savedir, max_workers=8, api=None, thresholds_file=SENSOR_THRESHOLDS, cache_dir=None,
+         output_format='kml', tails_dir=None, render_workers=1, simplify_tolerance=None, templatedir=TEMPLATE_DIR,
+         reuse_unchanged=False, reuse_max_age_hours=6, output_name=None, document_name=None, t0=None, t1=None,
+         regionate=None):
+    """
+    Generate a kml (or kmz) of glider deployments
+    :param deployment: 'active' for all active deployments, a deployment name e.g. maracoos_01-20240124T1612, or a
+        list of deployment records from the deployments API to write to one file (see gliderkmz_archive)
+    :param kml_type: 'deployed' 'deployed_ts' 'deployed_uv' 'deployed_ts_uv', or a list of kml types. The deployment
+        data are downloaded and processed once and each kml type is written to its own file.
+    :param savedir: directory to save the output file
+    :param max_workers: maximum number of concurrent API requests
+    :param api: optional GliderAPI client, a new one is created (and closed) if not provided
+    :param thresholds_file: sensor thresholds config file
+    :param cache_dir: optional directory for the local cache of deployment data
+    :param output_format: 'kml' or 'kmz' (compressed, with the glider tail images from tails_dir bundled)
+    :param tails_dir: optional local directory of glider tail images (<glider_name>.png) to bundle in the kmz, the
+        glider tails on the web server are used for gliders that aren't found here
+    :param render_workers: number of worker processes that render the deployments, 1 to render in this process
+    :param simplify_tolerance: optional tolerance in meters to simplify the tracks (Douglas-Peucker), None to
+        include every GPS fix
+    :param templatedir: directory containing the kml templates, defaults to templates/ in the package
+    :param reuse_unchanged: save the rendered kml for each deployment in savedir/.fragments, and reuse it on the next
+        run if the deployment hasn't surfaced since then (instead of downloading and processing it again)
+    :param reuse_max_age_hours: maximum age of a saved kml that's reused, so the parts that depend on the current time
+        (e.g. the Last 24 Hours folder) are refreshed even for deployments that haven't surfaced
+    :param output_name: optional name of the output files (without the kml type suffix and extension), defaults to
+        active_deployments, the deployment name, or glider_deployments for a list of deployments
+    :param document_name: optional name of the kml document, defaults to Active Deployments or Glider Deployments
+    :param t0: optional start of the time window, only the track and surfacings from this time on are included
+        (seconds since 1970-01-01)
+    :param t1: optional end of the time window, only the track and surfacings up to this time are included (seconds
+        since 1970-01-01)
+    :param regionate: optional number of surfacings in each tile to write a regionated kml for large deployments (see
+        regionate.py): the surfacings, current arrows and full track are split into tiles that Google Earth only loads
+        when they're zoomed in, and the document shows a simplified track until then. The tiles are saved in a
+        <output file name>_tiles directory next to a kml, or bundled into a kmz.
+    """
+    if output_format not in ('kml', 'kmz'):
+        raise ValueError(f'output_format must be kml or kmz, not {output_format}')
+    if regionate is not None and regionate < 1:
+        raise ValueError(f'regionate must be at least 1 surfacing per tile, not {regionate}')
+
+    kml_types = [kml_type] if isinstance(kml_type, str) else list(kml_type)
+    for kt in kml_types:
+        if kt not in ('deployed', 'deployed_ts', 'deployed_uv', 'deployed_ts_uv'):
+            raise ValueError(f'Invalid kml_type: {kt}')
+
+    sensor_list = ['m_battery', 'm_vacuum']
+
+    # load the sensor thresholds once for the whole run and make sure every sensor has thresholds defined
+    sensor_thresholds = load_sensor_thresholds(thresholds_file)
+    missing = [sensor for sensor in sensor_list if sensor not in sensor_thresholds]
+    if len(missing) > 0:
+        raise ValueError(f'{thresholds_file}: no thresholds defined for {", ".join(missing)}')
+
+    glider_tails = 'https://rucool.marine.rutgers.edu/gliders/glider_tails/'  # /www/web/rucool/gliders/glider_tails
+    # old glider tails location: https://marine.rutgers.edu/~kerfoot/icons/glider_tails/
+
+    # inspired by colorblind-friendly colormap (https://mpetroff.net/2018/03/color-cycle-picker/) for tracks/points
+    # NOTE: kml colors are encoded backwards from the HTML convention. HTML colors are "#rrggbbaa": Red Green Blue
+    # Alpha, while KML colors are "AABBGGRR": Alpha Blue Green Red.
+
+    # teal ('ffe9d043'), pink ('ff9e36d7'), purple ('ffd7369e'), yellow ('ff43d0e9'), orange ('ff3877f3'),
+    # green ('ff83c995'), gray ('ffc4c9d8')
+    colors = ['ffe9d043', 'ff9e36d7', 'ffd7369e', 'ff43d0e9', 'ff3877f3', 'ff83c995', 'ffc4c9d8']
+
+    # load the document template (the macros are loaded when it's rendered)
+    template = get_template('kml_template.kml', templatedir)
+
+    # define filename
+    ext = dict()
+    for kt in kml_types:
+        if kt == 'deployed':
+            ext[kt] = ''
+        else:
+            ext[kt] = f'_{kt.split("deployed_")[-1]}'
+
+    ts_now = dt.datetime.now(dt.UTC).strftime('%m/%d/%y %H:%M')
+
+    # reuse the same pooled connections to the glider API for every request in the run
+    close_api = api is None
+    if api is None:
+        api = GliderAPI(pool_maxsize=max_workers)
+
+    # only download the records that aren't already in the local cache
+    if cache_dir:
+        api = DeploymentCache(api, cache_dir)
+
+    if isinstance(deployment, str) and deployment != 'active':
+        output_name = output_name or deployment
+        document_name = document_name or 'Glider Deployments'
+        glider_deployments = [api.deployment(deployment)]
+        colors = ['ff43d0e9']  # yellow
+
+    else:
+        if deployment == 'active':  # 'deployed' 'deployed_ts' 'deployed_uv' 'deployed_ts_uv'
+            output_name = output_name or 'active_deployments'
+            document_name = document_name or 'Active Deployments'
+            glider_deployments = api.active_deployments()
+        else:
+            output_name = output_name or 'glider_deployments'
+            document_name = document_name or 'Glider Deployments'
+            glider_deployments = list(deployment)
+
+        # duplicate track colors if necessary
+        if len(glider_deployments) > len(colors):
+            repeatx = int(np.ceil(len(glider_deployments) / len(colors)))
+            colors = colors * repeatx
+
+    savefiles = {kt: os.path.join(savedir, f'{output_name}{ext[kt]}.{output_format}') for kt in kml_types}
+
+    # each deployment is rendered into one <Folder>, or for a regionated kml, a <Folder> that links to its tiles. The
+    # tiles for a kmz are kept in savedir/.tiles between runs (so the saved kml can be reused) and bundled into the kmz.
+    render = render_deployment
+    tile_dirs = dict()
+    if regionate:
+        tile_hrefs = dict()
+        for kt in kml_types:
+            if output_format == 'kmz':
+                tile_dirs[kt] = os.path.join(savedir, '.tiles', f'{output_name}{ext[kt]}')
+                tile_hrefs[kt] = 'tiles/'
+            else:
+                tile_dirs[kt] = os.path.join(savedir, f'{output_name}{ext[kt]}_tiles')
+                tile_hrefs[kt] = f'{output_name}{ext[kt]}_tiles/'
+
+    # build the dictionary for the formatting section of the kml
+    format_dict = dict()
+    kmz_files = dict()
+    for idx, gd in enumerate(glider_deployments):
+        glider_name = gd['glider_name']
+        glider_tail = os.path.join(glider_tails, f'{glider_name}.png')
+
+        # bundle the local glider tail image in the kmz so it doesn't have to be downloaded separately
+        if output_format == 'kmz' and tails_dir:
+            local_tail = os.path.join(tails_dir, f'{glider_name}.png')
+            if os.path.isfile(local_tail):
+                glider_tail = f'files/{glider_name}.png'
+                kmz_files[glider_tail] = local_tail
+
+        format_dict[gd['deployment_name']] = dict(
+            name=glider_name,
+            glider_tail=glider_tail,
+            deployment_color=colors[idx]
+        )
+
+    if regionate:
+        render = functools.partial(render_regionated_deployment, format_info=format_dict, tile_dirs=tile_dirs,
+                                   tile_hrefs=tile_hrefs, tile_surfacings=regionate)
+
+    # find the deployments that haven't changed since the last run and reuse their saved kml
+    fragment_dir = os.path.join(savedir, '.fragments')
+    fingerprints = dict()
+    reused = dict()
+    if reuse_unchanged:
+        for gd in glider_deployments:
+            deployment_name = gd['deployment_name']
+            fingerprints[deployment_name] = deployment_fingerprint(
+                gd,
+                glider_tail=format_dict[deployment_name]['glider_tail'],
+                sensor_thresholds={sensor: sensor_thresholds[sensor] for sensor in sensor_list},
+                current_sensors=CURRENT_SENSORS,
+                simplify_tolerance=simplify_tolerance,
+                templatedir=os.path.abspath(templatedir),
+                window=[t0, t1],
+                regionate=regionate
+            )
+            fragments = load_fragments(fragment_dir, deployment_name, fingerprints[deployment_name], kml_types,
+                                       reuse_max_age_hours)
+            if fragments is not None:
+                reused[deployment_name] = fragments
+    if len(reused) > 0:
+        print(f'Reusing the saved kml for {len(reused)} of {len(glider_deployments)} deployments (unchanged)')
+    changed_deployments = [gd for gd in glider_deployments if gd['deployment_name'] not in reused]
+
+    def deployment_info():
+        # grab the information for each deployment from the API (concurrently, a few deployments ahead) and build the
+        # information for the template one deployment at a time
+        for gd_api in fetch_deployments(api, changed_deployments, sensor_list, max_workers=max_workers, t0=t0, t1=t1):
+            deployment_name = gd_api['deployment']['deployment_name']
+            if len(gd_api['surfacings']) == 0:
+                # nothing to show, e.g. a deployment that only overlaps the time window between surfacings
+                print(f'{deployment_name}: no surfacings, skipping')
+                yield deployment_name, None
+                continue
+            glider_tail = format_dict[deployment_name]['glider_tail']
+            with profiling.stage('transform', deployment_name):
+                deployment_dict = build_deployment_dict(gd_api, ts_now, glider_tail, sensor_list, sensor_thresholds,
+                                                        simplify_tolerance)
+            yield deployment_name, deployment_dict
+
+    def rendered_fragments():
+        # render the <Folder> for each changed deployment for every kml type, in order. With render workers, the
+        # render stage is the time spent waiting for each deployment's result. Deployments that are skipped are left out
+        # of every kml
+        skipped = [''] * len(kml_types)
+
+        def result(deployment_name, future):
+            if future is None:
+                return skipped
+            with profiling.stage('render', deployment_name):
+                return future.result()
+
+        if render_workers > 1:
+            with ProcessPoolExecutor(max_workers=render_workers) as executor:
+                pending = collections.deque()
+                for deployment_name, deployment_dict in deployment_info():
+                    if deployment_dict is None:
+                        pending.append((deployment_name, None))
+                    else:
+                        pending.append((deployment_name,
+                                        executor.submit(render, templatedir, kml_types, deployment_dict)))
+                    # limit how many deployments are waiting to be rendered
+                    if len(pending) >= 2 * render_workers:
+                        yield result(*pending.popleft())
+                while len(pending) > 0:
+                    yield result(*pending.popleft())
+        else:
+            for deployment_name, deployment_dict in deployment_info():
+                if deployment_dict is None:
+                    yield skipped
+                    continue
+                with profiling.stage('render', deployment_name):
+                    fragments = render(templatedir, kml_types, deployment_dict)
+                yield fragments
+
+    def deployment_fragments():
+        # the <Folder> for every deployment in order, saved or newly rendered
+        rendered = rendered_fragments()
+        for gd in glider_deployments:
+            deployment_name = gd['deployment_name']
+            if deployment_name in reused:
+                yield deployment_name, reused.pop(deployment_name)
+            else:
+                fragments = next(rendered)
+                if reuse_unchanged:
+                    save_fragments(fragment_dir, deployment_name, fingerprints[deployment_name], kml_types,
+                                   fragments)
+                yield deployment_name, fragments
+
+    # stream each kml to its file, each deployment is rendered and written to every file before the next one is built
+    try:
+        with contextlib.ExitStack() as stack:
+            messages = []
+            document_ends = []
+            # open_output bundles the files into the kmz when it's closed, so the tiles are added once they're all
+            # rendered
+            kt_kmz_files = {kt: dict(kmz_files) for kt in kml_types}
+            for kt in kml_types:
+                message = stack.enter_context(open_output(savefiles[kt], output_format, kt_kmz_files[kt]))
+                with profiling.stage('render'):
+                    document_start, document_end = render_document(
+                        template,
+                        document_name=document_name,
+                        kml_type=kt,
+                        format_info=format_dict
+                    )
+                message.write(document_start)
+                messages.append(message)
+                document_ends.append(document_end)
+
+            for deployment_name, fragments in deployment_fragments():
+                with profiling.stage('write', deployment_name):
+                    for message, fragment in zip(messages, fragments):
+                        message.write(fragment)
+
+            # closing the files compresses the kmzs and moves the files into place
+            with profiling.stage('write'):
+                for message, document_end in zip(messages, document_ends):
+                    message.write(document_end)
+                if output_format == 'kmz':
+                    for kt, tile_dir in tile_dirs.items():
+                        for gd in glider_deployments:
+                            deployment_dir = os.path.join(tile_dir, gd['deployment_name'])
+                            if os.path.isdir(deployment_dir):
+                                for filename in sorted(os.listdir(deployment_dir)):
+                                    arcname = f'tiles/{gd["deployment_name"]}/{filename}'
+                                    kt_kmz_files[kt][arcname] = os.path.join(deployment_dir, filename)
+                stack.close()
+    finally:
+        if close_api:
+            api.close()
+
+
+if __name__ == '__main__':
+    deployment = 'active'  # active or maracoos_01-20240124T1612
+    kml_type = ['deployed', 'deployed_ts', 'deployed_uv', 'deployed_ts_uv']  # one or more kml types
+    savedir = '/Users/garzio/Documents/repo/lgarzio/gliderkmz/templates/'
+    max_workers = 8  # maximum number of concurrent API requests
+    thresholds_file = SENSOR_THRESHOLDS  # configs/sensor_thresholds.yml in the package
+    cache_dir = None  # directory for the local cache of deployment data, None to download everything every run
+    output_format = 'kml'  # 'kml' 'kmz'
+    tails_dir = None  # local glider tail images to bundle in the kmz, e.g. /www/web/rucool/gliders/glider_tails
+    render_workers = os.cpu_count()  # number of processes rendering deployments
+    simplify_tolerance = None  # track simplification tolerance in meters, None to include every GPS fix
+    reuse_unchanged = False  # reuse the saved kml for deployments that haven't surfaced since the last run
+    main(deployment, kml_type, savedir, max_workers, thresholds_file=thresholds_file, cache_dir=cache_dir,
+         output_format=output_format, tails_dir=tails_dir, render_workers=render_workers,
+         simplify_tolerance=simplify_tolerance, reuse_unchanged=reuse_unchanged)
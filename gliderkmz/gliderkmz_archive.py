@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+Export historical glider deployments in one batch: a list of deployments, or every deployment that was in the water
+between two dates, written to one combined kml (or kmz) or one per glider. The whole batch shares one HTTP session
+and template cache, and the deployments are downloaded, processed and rendered a few at a time (see gliderkmz.main),
+so memory doesn't grow with the number of deployments. The tracks and surfacings can be limited to a time window,
+which is passed on to the API requests.
+"""
+
+import os
+import collections
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from gliderkmz import gliderkmz
+from gliderkmz.glider_api import GliderAPI, overlaps
+
+
+def deployment_records(api, deployments, max_workers=8):
+    """
+    Grab the deployment records for a list of deployment names from the deployments API, concurrently
+    :param api: GliderAPI client
+    :param deployments: list of deployment names
+    :param max_workers: maximum number of concurrent API requests
+    :returns list of deployment records, in the same order as deployments
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(api.deployment, deployments))
+
+
+def export(kml_types, savedir, deployments=None, start=None, end=None, per_glider=False, output_name=None, t0=None,
+           t1=None, max_workers=8, api=None, **kwargs):
+    """
+    Write a batch of deployments to one combined kml/kmz, or one per glider
+    :param kml_types: list of kml types to generate: 'deployed' 'deployed_ts' 'deployed_uv' 'deployed_ts_uv'
+    :param savedir: directory to save the output files
+    :param deployments: list of deployment names to export. If not provided, every deployment that was in the water
+        between start and end is exported.
+    :param start: optional start date of the deployments to export (datetime, date string or seconds since 1970-01-01)
+    :param end: optional end date of the deployments to export (datetime, date string or seconds since 1970-01-01)
+    :param per_glider: write one file for each glider, named after the glider, instead of one combined file
+    :param output_name: name of the combined file (without the kml type suffix and extension), defaults to
+        glider_deployments_<start>_<end> for a date range, otherwise glider_deployments
+    :param t0: optional start of the time window for the tracks and surfacings (same formats as start)
+    :param t1: optional end of the time window for the tracks and surfacings (same formats as start)
+    :param max_workers: maximum number of concurrent API requests
+    :param api: optional GliderAPI client, a new one is created (and closed) if not provided
+    :param kwargs: other arguments passed to gliderkmz.main (e.g. output_format, render_workers, cache_dir)
+    :returns list of the names of the deployments that were exported
+    """
+    start, end, t0, t1 = (to_epoch(t) for t in (start, end, t0, t1))
+
+    close_api = api is None
+    if api is None:
+        api = GliderAPI(pool_maxsize=max_workers)
+
+    try:
+        if deployments is None:
+            if start is None and end is None:
+                raise ValueError('provide a list of deployments, or a start and/or end date')
+            glider_deployments = sorted(api.deployments(start, end), key=lambda d: d['start_date_epoch'])
+            if output_name is None:
+                output_name = '_'.join(['glider_deployments'] + [format_date(t) for t in (start, end) if t is not None])
+        else:
+            glider_deployments = deployment_records(api, deployments, max_workers)
+
+        # deployments that weren't in the water during the time window have nothing to show
+        glider_deployments = [d for d in glider_deployments if overlaps(d, t0, t1)]
+        if len(glider_deployments) == 0:
+            print('No deployments to export')
+            return []
+
+        if per_glider:
+            batches = collections.defaultdict(list)
+            for gd in glider_deployments:
+                batches[gd['glider_name']].append(gd)
+            batches = [(glider_name, f'{glider_name} Deployments', gds) for glider_name, gds in batches.items()]
+        else:
+            batches = [(output_name or 'glider_deployments', 'Glider Deployments', glider_deployments)]
+
+        for name, document_name, gds in batches:
+            print(f'Exporting {len(gds)} deployments to {name}')
+            gliderkmz.main(gds, kml_types, savedir, max_workers=max_workers, api=api, output_name=name,
+                           document_name=document_name, t0=t0, t1=t1, **kwargs)
+    finally:
+        if close_api:
+            api.close()
+
+    return [gd['deployment_name'] for gd in glider_deployments]
+
+
+def format_date(epoch):
+    return dt.datetime.fromtimestamp(epoch, dt.UTC).strftime('%Y%m%d')
+
+
+def to_epoch(t):
+    """
+    Convert a time to seconds since 1970-01-01. Times without a timezone are UTC.
+    :param t: None, seconds since 1970-01-01, datetime, or ISO 8601 date string e.g. 2023-06-01 or 2023-06-01T12:00
+    """
+    if t is None or isinstance(t, (int, float)):
+        return t
+    if isinstance(t, str):
+        t = dt.datetime.fromisoformat(t)
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=dt.UTC)
+    return t.timestamp()
+
+
+if __name__ == '__main__':
+    kml_types = ['deployed', 'deployed_ts', 'deployed_uv', 'deployed_ts_uv']
+    savedir = os.getcwd()
+    start = '2023-01-01'  # export the deployments that were in the water between start and end
+    end = '2023-12-31'
+    per_glider = False  # True to write one kmz per glider instead of one combined kmz
+    export(kml_types, savedir, start=start, end=end, per_glider=per_glider, output_format='kmz', render_workers=4)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+"""
+Command line interface for generating the glider deployment kmls, installed as the gliderkmz command.
+
+gliderkmz active -o /www/web/rucool/gliders/kml --cache-dir ~/.cache/gliderkmz
+gliderkmz maracoos_01-20240124T1612 ru40-20240215T1642 -k deployed deployed_ts -f kmz
+gliderkmz --start 2023-01-01 --end 2024-01-01 --per-glider -f kmz --render-workers 4
+gliderkmz ru40-20230601T1200 ru39-20230715T1400 --combine summer_2023 --window-start 2023-06-01 --window-end 2023-09-01
+gliderkmz --start 2023-01-01 --end 2024-01-01 --combine glider_deployments_2023 --regionate 50 -f kmz
+gliderkmz active --profile profile.csv --cprofile gliderkmz.prof
+"""
+
+import os
+import argparse
+
+KML_TYPES = ['deployed', 'deployed_ts', 'deployed_uv', 'deployed_ts_uv']
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='gliderkmz', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('deployments', nargs='*', default=['active'],
+                        help='"active" for all active deployments (default), or one or more deployment names '
+                             '(e.g. maracoos_01-20240124T1612)')
+    parser.add_argument('--start', metavar='DATE',
+                        help='export every deployment that was in the water between --start and --end (e.g. '
+                             '2023-01-01), instead of listing the deployments')
+    parser.add_argument('--end', metavar='DATE', help='end date for --start')
+    parser.add_argument('--combine', metavar='NAME',
+                        help='write all of the deployments to one combined file named NAME (the default with '
+                             '--start/--end), instead of one file per deployment')
+    parser.add_argument('--per-glider', action='store_true',
+                        help='write the deployments to one file per glider instead of one file per deployment')
+    parser.add_argument('--window-start', metavar='TIME',
+                        help='only include the track and surfacings from this time on (e.g. 2023-06-01T12:00, UTC)')
+    parser.add_argument('--window-end', metavar='TIME', help='only include the track and surfacings up to this time')
+    parser.add_argument('-k', '--kml-type', nargs='+', default=KML_TYPES, choices=KML_TYPES, metavar='KML_TYPE',
+                        help=f'kml types to generate: {" ".join(KML_TYPES)} (default: all)')
+    parser.add_argument('-o', '--savedir', default=os.getcwd(),
+                        help='directory to save the output files (default: current directory)')
+    parser.add_argument('-f', '--format', dest='output_format', default='kml', choices=['kml', 'kmz'],
+                        help='output format (default: kml)')
+    parser.add_argument('--cache-dir',
+                        help='directory for the local cache of deployment data, only new records are downloaded')
+    parser.add_argument('--reuse-unchanged', action='store_true',
+                        help="reuse the saved kml for deployments that haven't surfaced since the last run")
+    parser.add_argument('--max-workers', type=int, default=8,
+                        help='maximum number of concurrent API requests (default: 8)')
+    parser.add_argument('--render-workers', type=int, default=1,
+                        help='number of processes rendering the deployments (default: 1)')
+    parser.add_argument('--simplify-tolerance', type=float,
+                        help='simplify the tracks with this tolerance in meters (default: include every GPS fix)')
+    parser.add_argument('--regionate', type=int, metavar='N',
+                        help='split each deployment into tiles of N surfacings that are only loaded when zoomed in, '
+                             'for large deployments (default: one document)')
+    parser.add_argument('--tails-dir',
+                        help='local directory of glider tail images (<glider_name>.png) to bundle in the kmz')
+    parser.add_argument('--thresholds',
+                        help='sensor thresholds config file (default: configs/sensor_thresholds.yml in the package)')
+    parser.add_argument('--daemon', action='store_true',
+                        help='keep running and regenerate the active deployment kmls when a deployment surfaces')
+    parser.add_argument('--interval', type=int, default=600,
+                        help='with --daemon, seconds between checks for new surfacings (default: 600)')
+    parser.add_argument('--per-deployment', action='store_true',
+                        help='with --daemon, also write a kml for each deployment when it surfaces')
+    parser.add_argument('--profile', metavar='REPORT',
+                        help='record the time, calls and change in memory (RSS) of each stage for each deployment and '
+                             'save the report to a .json or .csv file')
+    parser.add_argument('--cprofile', metavar='FILE', help='profile the run with cProfile and save the stats to a file')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    archive = bool(args.start or args.end or args.combine or args.per_glider)
+    if args.daemon and (args.deployments != ['active'] or archive):
+        parser.error('--daemon only generates the active deployment kmls')
+    if args.per_deployment and not args.daemon:
+        parser.error('--per-deployment is only used with --daemon')
+    if (args.start or args.end) and args.deployments != ['active']:
+        parser.error('list the deployments to export or select them with --start/--end, not both')
+    if archive and not (args.start or args.end) and 'active' in args.deployments:
+        parser.error('list the deployments to export, or select them with --start/--end')
+    if args.regionate is not None and args.regionate < 1:
+        parser.error('--regionate must be at least 1 surfacing per tile')
+
+    kwargs = dict(
+        output_format=args.output_format,
+        render_workers=args.render_workers,
+        simplify_tolerance=args.simplify_tolerance,
+        tails_dir=args.tails_dir,
+        reuse_unchanged=args.reuse_unchanged,
+        regionate=args.regionate
+    )
+    if args.thresholds:
+        kwargs['thresholds_file'] = args.thresholds
+
+    start = end = None
+    if args.start or args.end or args.window_start or args.window_end:
+        from gliderkmz.gliderkmz_archive import to_epoch
+        try:
+            start, end, t0, t1 = (to_epoch(t) for t in (args.start, args.end, args.window_start, args.window_end))
+        except ValueError as e:
+            parser.error(f'invalid date: {e}')
+        if args.window_start or args.window_end:
+            kwargs.update(t0=t0, t1=t1)
+
+    from gliderkmz import profiling
+    if args.profile or args.cprofile:
+        profiling.enable(args.profile, args.cprofile)
+
+    # imported after the arguments are parsed so --help and argument errors don't wait for numpy, jinja2, etc.
+    try:
+        if args.daemon:
+            from gliderkmz import gliderkmz_daemon
+            gliderkmz_daemon.run(args.kml_type, args.savedir, interval=args.interval,
+                                 per_deployment=args.per_deployment, max_workers=args.max_workers,
+                                 cache_dir=args.cache_dir, **kwargs)
+            return
+
+        from gliderkmz import gliderkmz, gliderkmz_archive
+        from gliderkmz.glider_api import GliderAPI
+        os.makedirs(args.savedir, exist_ok=True)
+        with GliderAPI(pool_maxsize=args.max_workers) as api:
+            if archive:
+                gliderkmz_archive.export(args.kml_type, args.savedir,
+                                         deployments=None if args.start or args.end else args.deployments,
+                                         start=start, end=end, per_glider=args.per_glider,
+                                         output_name=args.combine, max_workers=args.max_workers, api=api,
+                                         cache_dir=args.cache_dir, **kwargs)
+                return
+            for deployment in args.deployments:
+                gliderkmz.main(deployment, args.kml_type, args.savedir, max_workers=args.max_workers, api=api,
+                               cache_dir=args.cache_dir, **kwargs)
+    finally:
+        profiling.disable()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""
+Regenerate the active deployment kmls on a schedule from one long-running process. The process keeps its HTTP
+session, template cache and local deployment data cache between runs, and only regenerates the kmls when a
+deployment has a new surfacing (or a deployment starts or ends). The rendered kml of each deployment is saved and
+reused (see gliderkmz.main reuse_unchanged), so only the deployments that surfaced are downloaded and rendered again.
+"""
+
+import os
+import signal
+import threading
+import time
+import traceback
+import datetime as dt
+from gliderkmz import gliderkmz
+from gliderkmz.glider_api import GliderAPI
+
+
+def last_surfacings(active_deployments):
+    """
+    Build the dictionary of the last surfacing for each active deployment, used to find which deployments changed
+    """
+    last_surfacing = dict()
+    for ad in active_deployments:
+        ls = ad['last_surfacing']
+        last_surfacing[ad['deployment_name']] = (ls['surfacing_id'], ls['connect_time_epoch'])
+    return last_surfacing
+
+
+def run(kml_types, savedir, interval=600, per_deployment=False, max_workers=8, cache_dir=None, stop=None, **kwargs):
+    """
+    Poll the active deployments and regenerate the kmls when something changed
+    :param kml_types: list of kml types to generate: 'deployed' 'deployed_ts' 'deployed_uv' 'deployed_ts_uv'
+    :param savedir: directory to save the output files
+    :param interval: seconds between checks of the active deployments
+    :param per_deployment: also write a kml for each deployment, only for the deployments that changed
+    :param max_workers: maximum number of concurrent API requests
+    :param cache_dir: optional directory for the local cache of deployment data
+    :param stop: optional threading.Event, the loop exits when it's set. By default the loop runs until the process
+        gets SIGINT or SIGTERM
+    :param kwargs: other arguments passed to gliderkmz.main (e.g. output_format, render_workers). The saved kml of
+        the deployments that haven't surfaced is always reused.
+    """
+    kwargs = dict(kwargs, reuse_unchanged=True)
+
+    if stop is None:
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda signum, frame: stop.set())
+
+    api = GliderAPI(pool_maxsize=max_workers)
+    previous = None
+    while not stop.is_set():
+        t0 = time.monotonic()
+        try:
+            active_deployments = api.active_deployments()
+            current = last_surfacings(active_deployments)
+            if current != previous:
+                changed = [d for d in current if previous is None or previous.get(d) != current[d]]
+                print(f'{dt.datetime.now(dt.UTC):%Y-%m-%d %H:%M:%S} regenerating kmls, updated deployments: '
+                      f'{", ".join(changed) if changed else "none (deployment ended)"}')
+                # write the deployments that were just checked, instead of requesting the active deployments again
+                gliderkmz.main(active_deployments, kml_types, savedir, max_workers=max_workers, api=api,
+                               cache_dir=cache_dir, output_name='active_deployments',
+                               document_name='Active Deployments', **kwargs)
+                if per_deployment:
+                    for deployment in changed:
+                        gliderkmz.main(deployment, kml_types, savedir, max_workers=max_workers, api=api,
+                                       cache_dir=cache_dir, **kwargs)
+                previous = current
+        except Exception:
+            # keep running, the next check will try again
+            traceback.print_exc()
+
+        stop.wait(max(0, interval - (time.monotonic() - t0)))
+
+    api.close()
+
+
+if __name__ == '__main__':
+    kml_types = ['deployed', 'deployed_ts', 'deployed_uv', 'deployed_ts_uv']
+    savedir = os.getcwd()
+    interval = 600  # seconds between checks for new surfacings
+    cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'gliderkmz')
+    run(kml_types, savedir, interval=interval, cache_dir=cache_dir)
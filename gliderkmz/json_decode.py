@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+"""
+Decoding for the glider API responses. The tracks API returns the entire deployment history as GeoJSON, but only the
+time, location and surfacing id of the Point features are used, so tracks responses are decoded straight into numpy
+columns instead of a list of feature dictionaries:
+    json   (default) standard library, each feature is reduced to the fields that are used as soon as it's decoded,
+           so the full feature dictionaries never pile up. This is also faster than decoding them all.
+    ijson  (optional, GLIDERKMZ_TRACK_DECODER=ijson) streams the response body and only keeps the fields that are
+           used, so neither the response nor the decoded features are ever held in memory. It uses less memory for
+           very large deployments, but it's ~2x slower, especially when many deployments are fetched at once.
+Other responses (deployments, surfacings, sensors) are decoded with orjson if it's installed (~2x faster), otherwise
+json.
+"""
+
+import os
+import json
+import numpy as np
+try:
+    import ijson
+except ImportError:
+    ijson = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def feature_columns(features):
+    """
+    Pull the track columns out of a list of GeoJSON features from the tracks API, skipping anything that isn't a Point
+    :param features: list of GeoJSON feature dictionaries
+    :returns dictionary of numpy arrays gps_epoch, lon, lat and sid, one value per Point feature
+    """
+    return point_columns((tf['properties']['gps_epoch'], tf['geometry']['coordinates'][0],
+                          tf['geometry']['coordinates'][1], tf['properties']['sid'])
+                         for tf in features if tf['geometry']['type'] == 'Point')
+
+
+def ijson_points(fp):
+    """
+    Stream the (gps_epoch, lon, lat, sid) of each Point feature from a tracks response with ijson. Only the parser
+    events for those fields are kept, the coordinates of other geometries (e.g. LineStrings) are never built.
+    """
+    fields = {'features.item.geometry.type': 'type', 'features.item.properties.gps_epoch': 'gps_epoch',
+              'features.item.properties.sid': 'sid'}
+    feature = dict()
+    coordinates = []
+    for prefix, event, value in ijson.parse(fp, use_float=True):
+        if prefix == 'features.item.geometry.coordinates.item':
+            if event == 'number':  # Point coordinates, the coordinates of other geometries are nested deeper
+                coordinates.append(value)
+        elif prefix in fields:
+            feature[fields[prefix]] = value
+        elif prefix == 'features.item' and event == 'end_map':
+            if feature.get('type') == 'Point':
+                yield feature.get('gps_epoch'), coordinates[0], coordinates[1], feature.get('sid')
+            feature = dict()
+            coordinates = []
+
+
+def loads(data):
+    """
+    Decode a json response body
+    :param data: bytes or str
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def point_columns(points):
+    """
+    Convert (gps_epoch, lon, lat, sid) tuples to the track columns
+    :param points: iterable of tuples
+    :returns dictionary of numpy arrays gps_epoch, lon, lat and sid
+    """
+    points = list(points)
+    if len(points) == 0:
+        return dict(gps_epoch=np.array([], dtype='int'), lon=np.array([], dtype='float'),
+                    lat=np.array([], dtype='float'), sid=np.array([], dtype='int'))
+    gps_epoch, lon, lat, sid = zip(*points)
+    return dict(
+        gps_epoch=np.array(gps_epoch),
+        lon=np.array(lon, dtype='float'),
+        lat=np.array(lat, dtype='float'),
+        sid=np.array(sid)
+    )
+
+
+def reduce_feature(obj):
+    """
+    object_hook for the json module that reduces each GeoJSON feature to a (gps_epoch, lon, lat, sid) tuple, or None
+    if it isn't a Point, as soon as it's decoded
+    """
+    if 'coordinates' in obj:  # geometry
+        return tuple(obj['coordinates'][:2]) if obj.get('type') == 'Point' else None
+    if 'geometry' in obj and 'properties' in obj:  # feature, with the geometry already reduced
+        if obj['geometry'] is None:
+            return None
+        return obj['properties']['gps_epoch'], *obj['geometry'], obj['properties']['sid']
+    return obj
+
+
+def track_columns(fp, backend=None):
+    """
+    Decode a tracks API response into the track columns
+    :param fp: binary file-like object of the response body, e.g. requests response.raw or an open file
+    :param backend: 'json' or 'ijson', defaults to track_backend()
+    :returns dictionary of numpy arrays gps_epoch, lon, lat and sid, one value per Point feature in the response
+    """
+    backend = backend or track_backend()
+    if backend not in ('json', 'ijson'):
+        raise ValueError(f'track decoder must be json or ijson, not {backend}')
+    if backend == 'ijson':
+        if ijson is None:
+            raise ImportError('the ijson track decoder requires ijson: pip install gliderkmz[streaming]')
+        return point_columns(ijson_points(fp))
+    features = json.loads(fp.read(), object_hook=reduce_feature)['features']
+    return point_columns(point for point in features if point is not None)
+
+
+def track_backend():
+    """
+    Name of the backend track_columns uses by default, json unless the GLIDERKMZ_TRACK_DECODER environment variable
+    selects ijson
+    """
+    return os.environ.get('GLIDERKMZ_TRACK_DECODER', 'json')
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+"""
+Vectorized glider dive kinematics: distance, time, speed over ground and depth-averaged currents for every dive in a
+deployment at once. A dive starts at the last GPS fix before the glider leaves the surface and ends at the first GPS
+fix when it comes back up.
+
+The glider's velocity through the water (glide) is the velocity over ground minus the depth-averaged current. The
+current isn't in the surfacing records, so the glide speed and current are only calculated when the current measured
+by the glider (m_water_vx and m_water_vy) is provided, and are left out (nan) otherwise.
+"""
+
+import numpy as np
+from gliderkmz.track_simplify import EARTH_RADIUS_M
+
+DRIFT_SECONDS = 86400  # the current arrows show 1 day of drift
+
+
+def current_arrows(lon, lat, u, v, drift_seconds=DRIFT_SECONDS):
+    """
+    Find the end points of the current arrows: where something drifting with the current from each position would be
+    after drift_seconds
+    :param lon: array of longitudes of the start of the arrows (decimal degrees)
+    :param lat: array of latitudes of the start of the arrows (decimal degrees)
+    :param u: array of eastward current velocities (m/s)
+    :param v: array of northward current velocities (m/s)
+    :param drift_seconds: drift time in seconds
+    :returns arrays of longitudes and latitudes of the end of the arrows
+    """
+    return offset_position(lon, lat, np.asarray(u) * drift_seconds, np.asarray(v) * drift_seconds)
+
+
+def dive_kinematics(t0, lon0, lat0, t1, lon1, lat1, current_u=None, current_v=None):
+    """
+    Calculate the kinematics of each dive from the GPS fixes before and after the dive
+    :param t0: array of times of the last GPS fix before each dive (seconds since 1970-01-01)
+    :param lon0: array of longitudes of the last GPS fix before each dive (decimal degrees)
+    :param lat0: array of latitudes of the last GPS fix before each dive (decimal degrees)
+    :param t1: array of times of the first GPS fix after each dive (seconds since 1970-01-01)
+    :param lon1: array of longitudes of the first GPS fix after each dive (decimal degrees)
+    :param lat1: array of latitudes of the first GPS fix after each dive (decimal degrees)
+    :param current_u: optional array of the measured eastward depth-averaged current on each dive (m/s)
+    :param current_v: optional array of the measured northward depth-averaged current on each dive (m/s)
+    :returns dictionary of arrays: dive_time (s), distance (m), total_speed (m/s), total_bearing (degrees),
+        glide_speed (m/s), glide_bearing (degrees), current_u, current_v, current_speed (m/s) and current_bearing
+        (degrees, the direction the current is flowing toward). Values are nan for dives that can't be calculated
+        (e.g. missing GPS fixes, or no time between the fixes), and the glide and current values are nan without
+        the measured current.
+    """
+    t0 = np.asarray(t0, dtype='float')
+    t1 = np.asarray(t1, dtype='float')
+    dive_time = t1 - t0
+    dive_time[~(dive_time > 0)] = np.nan
+
+    # velocity over ground
+    distance, total_bearing = distance_bearing(lon0, lat0, lon1, lat1)
+    total_speed = distance / dive_time
+    total_u, total_v = velocity_components(total_speed, total_bearing)
+
+    # depth-averaged current, only from measurements (an assumed glide velocity would make up the current)
+    if current_u is None or current_v is None:
+        current_u = current_v = np.full(len(dive_time), np.nan)
+    current_u = np.asarray(current_u, dtype='float')
+    current_v = np.asarray(current_v, dtype='float')
+    current_speed, current_bearing = speed_bearing(current_u, current_v)
+
+    # velocity through the water
+    glide_speed, glide_bearing = speed_bearing(total_u - current_u, total_v - current_v)
+
+    return dict(
+        dive_time=dive_time,
+        distance=distance,
+        total_speed=total_speed,
+        total_bearing=total_bearing,
+        glide_speed=glide_speed,
+        glide_bearing=glide_bearing,
+        current_u=current_u,
+        current_v=current_v,
+        current_speed=current_speed,
+        current_bearing=current_bearing
+    )
+
+
+def distance_bearing(lon0, lat0, lon1, lat1):
+    """
+    Great-circle distance and initial bearing between pairs of positions
+    :param lon0: array of start longitudes (decimal degrees)
+    :param lat0: array of start latitudes (decimal degrees)
+    :param lon1: array of end longitudes (decimal degrees)
+    :param lat1: array of end latitudes (decimal degrees)
+    :returns arrays of distance (m) and bearing (degrees clockwise from north, 0-360)
+    """
+    lon0, lat0, lon1, lat1 = (np.deg2rad(np.asarray(x, dtype='float')) for x in (lon0, lat0, lon1, lat1))
+    dlon = lon1 - lon0
+    dlat = lat1 - lat0
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat0) * np.cos(lat1) * np.sin(dlon / 2) ** 2
+    distance = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+    y = np.sin(dlon) * np.cos(lat1)
+    x = np.cos(lat0) * np.sin(lat1) - np.sin(lat0) * np.cos(lat1) * np.cos(dlon)
+    bearing = np.mod(np.rad2deg(np.arctan2(y, x)), 360)
+
+    return distance, bearing
+
+
+def offset_position(lon, lat, dx, dy):
+    """
+    Move positions by a distance east and north (flat-earth approximation, for distances of up to a few hundred km)
+    :param lon: array of longitudes (decimal degrees)
+    :param lat: array of latitudes (decimal degrees)
+    :param dx: array of distances east (m)
+    :param dy: array of distances north (m)
+    :returns arrays of the new longitudes and latitudes
+    """
+    lon = np.asarray(lon, dtype='float')
+    lat = np.asarray(lat, dtype='float')
+    new_lat = lat + np.rad2deg(np.asarray(dy) / EARTH_RADIUS_M)
+    new_lon = lon + np.rad2deg(np.asarray(dx) / (EARTH_RADIUS_M * np.cos(np.deg2rad(lat))))
+    return new_lon, new_lat
+
+
+def speed_bearing(u, v):
+    """
+    Convert velocity components to speed and bearing
+    :param u: array of eastward velocities
+    :param v: array of northward velocities
+    :returns arrays of speed and bearing (degrees clockwise from north, 0-360)
+    """
+    return np.hypot(u, v), np.mod(np.rad2deg(np.arctan2(u, v)), 360)
+
+
+def surfacing_gps_fixes(track_sid, track_epoch, track_lon, track_lat, surfacing_ids):
+    """
+    Find the first and last GPS fix of each surfacing from the track
+    :param track_sid: array of the surfacing id of each track point
+    :param track_epoch: array of times of the track points (seconds since 1970-01-01)
+    :param track_lon: array of longitudes of the track points (decimal degrees)
+    :param track_lat: array of latitudes of the track points (decimal degrees)
+    :param surfacing_ids: array of surfacing ids to find the GPS fixes for
+    :returns dictionary of arrays (one value per surfacing_id, nan if there are no track points for the surfacing):
+        first_epoch, first_lon, first_lat, last_epoch, last_lon, last_lat
+    """
+    track_sid = np.asarray(track_sid, dtype='float')
+    track_epoch = np.asarray(track_epoch, dtype='float')
+    track_lon = np.asarray(track_lon, dtype='float')
+    track_lat = np.asarray(track_lat, dtype='float')
+    surfacing_ids = np.asarray(surfacing_ids, dtype='float')
+
+    fields = ['first_epoch', 'first_lon', 'first_lat', 'last_epoch', 'last_lon', 'last_lat']
+    if len(track_sid) == 0:
+        return {field: np.full(len(surfacing_ids), np.nan) for field in fields}
+
+    # sort by surfacing and time, then find the first and last point of each surfacing
+    order = np.lexsort((track_epoch, track_sid))
+    sids, first, counts = np.unique(track_sid[order], return_index=True, return_counts=True)
+    rows = dict(first=order[first], last=order[first + counts - 1])
+
+    idx = np.minimum(np.searchsorted(sids, surfacing_ids), len(sids) - 1)
+    found = sids[idx] == surfacing_ids
+
+    fixes = dict()
+    for field in fields:
+        which, name = field.split('_')
+        values = dict(epoch=track_epoch, lon=track_lon, lat=track_lat)[name]
+        fixes[field] = np.where(found, values[rows[which][idx]], np.nan)
+    return fixes
+
+
+def velocity_components(speed, bearing):
+    """
+    Convert speed and bearing to velocity components
+    :param speed: array of speeds
+    :param bearing: array of bearings (degrees clockwise from north)
+    :returns arrays of eastward and northward velocities
+    """
+    bearing = np.deg2rad(np.asarray(bearing, dtype='float'))
+    return speed * np.sin(bearing), speed * np.cos(bearing)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+
+"""
+Jinja environment for the kml templates, shared by everything that renders kmls in the process. Templates are
+only loaded when they're first used, compiled templates are kept in a bytecode cache on disk so later processes
+skip compiling them, and the template files aren't checked for changes once they're loaded.
+"""
+
+import os
+import functools
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+
+@functools.lru_cache
+def get_environment(templatedir=TEMPLATE_DIR, bytecode_cache_dir=None, auto_reload=False):
+    """
+    Load the jinja environment for the kml templates, once per process
+    :param templatedir: directory containing the kml templates, defaults to templates/ in the package
+    :param bytecode_cache_dir: directory for the compiled templates, defaults to a per-user directory in the system
+        temp directory
+    :param auto_reload: check the template files for changes every time they're used (for template development)
+    """
+    if bytecode_cache_dir:
+        os.makedirs(bytecode_cache_dir, exist_ok=True)
+    return Environment(
+        loader=FileSystemLoader(templatedir),
+        bytecode_cache=FileSystemBytecodeCache(bytecode_cache_dir),
+        auto_reload=auto_reload
+    )
+
+
+def get_template(name, templatedir=TEMPLATE_DIR):
+    return get_environment(templatedir).get_template(name)
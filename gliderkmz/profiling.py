@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+"""
+Optional instrumentation for the kml generation pipeline. When it's enabled, every stage (API requests, json decoding,
+track building, surfacing processing, sensor data, sensor windows, rendering, writing) records its wall time, number
+of calls and how the process RSS (resident memory) changed over it, for each deployment. The report is written as json
+or csv (by the file extension), and the whole run can also be profiled with cProfile.
+
+Enable with the gliderkmz --profile/--cprofile options, or by setting environment variables (the files are written
+when the process exits):
+GLIDERKMZ_PROFILE=profile.csv GLIDERKMZ_CPROFILE=gliderkmz.prof python -m gliderkmz.gliderkmz
+
+When it's not enabled, stage() returns the same do-nothing context manager every time.
+"""
+
+import os
+import atexit
+import collections
+import contextlib
+import cProfile
+import csv
+import json
+import threading
+import time
+
+NOT_PROFILING = contextlib.nullcontext()
+
+_profiler = None
+
+
+class Profiler:
+    """
+    Collects the time, number of calls and RSS of each (stage, deployment):
+        rss_change_mb   change in the process RSS from the start to the end of the stage, added up over the calls.
+                        Positive for memory the stage kept, negative for memory it released.
+        rss_at_exit_mb  highest process RSS at the end of a call
+    Stages can be nested (e.g. json decode inside an API request) and recorded from multiple threads, so the times and
+    RSS changes of nested or concurrent stages add up to more than the run's. The RSS is 0 where it's not available
+    (see current_rss_mb).
+    :param report_file: optional file to write the report to (.json or .csv)
+    :param cprofile_file: optional file to write cProfile stats to (for snakeviz, pstats, etc.). Only the thread that
+        enables profiling is profiled.
+    """
+    def __init__(self, report_file=None, cprofile_file=None):
+        self.report_file = report_file
+        self.cprofile_file = cprofile_file
+        self.stats = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.cprofile = None
+        if cprofile_file:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    @contextlib.contextmanager
+    def stage(self, name, deployment=None):
+        rss0 = current_rss_mb()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            rss1 = current_rss_mb()
+            with self.lock:
+                stats = self.stats.setdefault((name, deployment),
+                                              dict(calls=0, seconds=0, rss_change_mb=0, rss_at_exit_mb=0))
+                stats['calls'] += 1
+                stats['seconds'] += seconds
+                stats['rss_change_mb'] += rss1 - rss0
+                stats['rss_at_exit_mb'] = max(stats['rss_at_exit_mb'], rss1)
+
+    def rows(self):
+        with self.lock:
+            return [dict(stage=name, deployment=deployment or '', calls=stats['calls'],
+                         seconds=round(stats['seconds'], 6), rss_change_mb=round(stats['rss_change_mb'], 1),
+                         rss_at_exit_mb=round(stats['rss_at_exit_mb'], 1))
+                    for (name, deployment), stats in self.stats.items()]
+
+    def stop(self):
+        """
+        Stop profiling and write the report and cProfile stats
+        """
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.cprofile_file)
+            self.cprofile = None
+        if self.report_file:
+            write_report(self.report_file, self.rows())
+
+    def summary(self):
+        """
+        Print the total time, calls and RSS change of each stage, over all deployments
+        """
+        totals = collections.OrderedDict()
+        for row in self.rows():
+            total = totals.setdefault(row['stage'], dict(calls=0, seconds=0, rss_change_mb=0, rss_at_exit_mb=0))
+            total['calls'] += row['calls']
+            total['seconds'] += row['seconds']
+            total['rss_change_mb'] += row['rss_change_mb']
+            total['rss_at_exit_mb'] = max(total['rss_at_exit_mb'], row['rss_at_exit_mb'])
+        print(f'{"stage":>24} {"calls":>8} {"time (s)":>10} {"RSS change (MB)":>16} {"RSS at exit (MB)":>17}')
+        for name, total in totals.items():
+            print(f'{name:>24} {total["calls"]:>8} {total["seconds"]:>10.3f} {total["rss_change_mb"]:>16.1f} '
+                  f'{total["rss_at_exit_mb"]:>17.1f}')
+
+
+def disable():
+    """
+    Stop profiling, write the report and cProfile stats and print a summary
+    """
+    global _profiler
+    if _profiler is None:
+        return
+    profiler = _profiler
+    _profiler = None
+    profiler.stop()
+    profiler.summary()
+
+
+def enable(report_file=None, cprofile_file=None):
+    """
+    Start recording the pipeline stages
+    :param report_file: optional file to write the report to when profiling is disabled (.json or .csv)
+    :param cprofile_file: optional file to write cProfile stats to when profiling is disabled
+    """
+    global _profiler
+    _profiler = Profiler(report_file, cprofile_file)
+
+
+def current_rss_mb():
+    """
+    Current resident set size of the process in MB, from /proc/self/statm, 0 where it's not available (e.g. macOS and
+    Windows). The peak RSS (getrusage ru_maxrss) only ever goes up, so it can't show the memory used by each stage.
+    """
+    try:
+        with open('/proc/self/statm', encoding='ascii') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, AttributeError, ValueError, IndexError):
+        return 0
+
+
+@contextlib.contextmanager
+def recording():
+    """
+    Record the pipeline stages within a block without writing a report, e.g. to time the stages in a benchmark. Any
+    profiling that's already enabled is paused until the block exits.
+    :returns the Profiler, with the stages recorded so far (see Profiler.rows)
+    """
+    global _profiler
+    previous = _profiler
+    _profiler = Profiler()
+    try:
+        yield _profiler
+    finally:
+        _profiler = previous
+
+
+def stage(name, deployment=None):
+    """
+    Context manager that records a pipeline stage, if profiling is enabled
+    :param name: stage name, e.g. 'render'
+    :param deployment: optional deployment name
+    """
+    if _profiler is None:
+        return NOT_PROFILING
+    return _profiler.stage(name, deployment)
+
+
+def timed(name, deployment, func, *args, **kwargs):
+    """
+    Call func(*args, **kwargs) as a pipeline stage, e.g. for functions submitted to a thread pool
+    """
+    with stage(name, deployment):
+        return func(*args, **kwargs)
+
+
+def write_report(report_file, rows):
+    """
+    Write the profiling report as json or csv, depending on the file extension
+    :param report_file: file path ending in .json or .csv
+    :param rows: list of dictionaries of stage, deployment, calls, seconds, rss_change_mb and rss_at_exit_mb (see
+        Profiler)
+    """
+    if report_file.endswith('.csv'):
+        with open(report_file, mode='w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=['stage', 'deployment', 'calls', 'seconds', 'rss_change_mb',
+                                                   'rss_at_exit_mb'])
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(report_file, mode='w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2)
+
+
+if os.environ.get('GLIDERKMZ_PROFILE') or os.environ.get('GLIDERKMZ_CPROFILE'):
+    enable(os.environ.get('GLIDERKMZ_PROFILE'), os.environ.get('GLIDERKMZ_CPROFILE'))
+    atexit.register(disable)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+"""
+Split deployments into tiles for regionated kmls. Each tile is a stretch of a deployment (a number of consecutive
+surfacings and the track between them) that's written to its own kml file and linked from the main document with a
+<NetworkLink> inside a <Region>, so Google Earth only loads a tile when its area is large enough on the screen (and
+for the time-enabled kmls, when it's in the selected time span). A glider track is a path, so splitting it in time
+also splits it into compact areas, without cutting the track at arbitrary grid lines. Until a tile is loaded, the main
+document shows a simplified track of the tile in the same region, which is hidden once the tile is loaded (its
+maxLodPixels is the tile's minLodPixels), so the two tracks are never shown together.
+"""
+
+import numpy as np
+from gliderkmz.track_simplify import douglas_peucker
+
+TILE_SURFACINGS = 50  # number of surfacings in each tile
+LOD_PIXELS = 256  # a tile is loaded once its region is this many pixels across on the screen
+MIN_REGION_DEGREES = 0.02  # minimum size of a region, so a tile with only a few points close together still loads
+COARSE_TOLERANCE_M = 1000  # simplification tolerance for the track that's shown until the tiles are loaded
+
+
+def bounding_box(lon, lat, min_degrees=MIN_REGION_DEGREES):
+    """
+    Find the bounding box of a set of positions for a kml <LatLonAltBox>, padded to at least min_degrees across
+    :param lon: array of longitudes (decimal degrees), nan values are ignored
+    :param lat: array of latitudes (decimal degrees), nan values are ignored
+    :param min_degrees: minimum width and height of the box (degrees)
+    :returns dictionary of north, south, east and west (decimal degrees), or None if there are no valid positions
+    """
+    lon = np.asarray(lon, dtype='float')
+    lat = np.asarray(lat, dtype='float')
+    valid = ~np.isnan(lon) & ~np.isnan(lat)
+    if not np.any(valid):
+        return None
+    west, east = np.min(lon[valid]), np.max(lon[valid])
+    south, north = np.min(lat[valid]), np.max(lat[valid])
+    lon_pad = max(min_degrees - (east - west), 0) / 2
+    lat_pad = max(min_degrees - (north - south), 0) / 2
+    return dict(
+        north=round(min(north + lat_pad, 90), 5),
+        south=round(max(south - lat_pad, -90), 5),
+        east=round(min(east + lon_pad, 180), 5),
+        west=round(max(west - lon_pad, -180), 5)
+    )
+
+
+def coarse_track(track, tolerance_m=COARSE_TOLERANCE_M):
+    """
+    Simplify a track for the view before the tiles are loaded
+    :param track: dictionary of numpy arrays gps_epoch, lon and lat, sorted by time
+    :param tolerance_m: simplification tolerance in meters
+    :returns dictionary of numpy arrays gps_epoch, lon and lat of the points that are kept
+    """
+    keep = douglas_peucker(track['lon'], track['lat'], tolerance_m)
+    return {col: np.asarray(values)[keep] for col, values in track.items()}
+
+
+def split_tiles(surfacing_epochs, track_epochs, tile_surfacings=TILE_SURFACINGS):
+    """
+    Split a deployment into tiles of tile_surfacings consecutive surfacings. The track points are split at the same
+    times, and each tile's track also includes the first point of the next tile so the track is continuous.
+    :param surfacing_epochs: array of surfacing connect times (seconds since 1970-01-01)
+    :param track_epochs: array of track times (seconds since 1970-01-01), sorted
+    :param tile_surfacings: number of surfacings in each tile
+    :returns array of the tile number of each surfacing, and a list of the slice of the track for each tile
+    """
+    surfacing_epochs = np.asarray(surfacing_epochs, dtype='float')
+    track_epochs = np.asarray(track_epochs, dtype='float')
+
+    # each tile after the first one starts at the connect time of its first surfacing
+    order = np.argsort(surfacing_epochs, kind='stable')
+    breaks = surfacing_epochs[order[tile_surfacings::tile_surfacings]]
+    surfacing_tiles = np.searchsorted(breaks, surfacing_epochs, side='right')
+
+    track_breaks = np.searchsorted(track_epochs, breaks, side='left')
+    starts = np.concatenate([[0], track_breaks])
+    stops = np.minimum(np.concatenate([track_breaks + 1, [len(track_epochs)]]), len(track_epochs))
+    return surfacing_tiles, [slice(int(start), int(stop)) for start, stop in zip(starts, stops)]
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+"""
+Simplify glider tracks before they're rendered, so long deployments don't put every GPS fix into the kml.
+"""
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000
+
+
+def douglas_peucker(lon, lat, tolerance_m):
+    """
+    Find the track points to keep with the Douglas-Peucker algorithm: a point is dropped if it's within tolerance_m
+    of the line between the points that are kept on either side of it. Locations are projected to meters with an
+    equirectangular projection centered on the track, and the distances for all of the points in a section of the
+    track are calculated at once.
+    :param lon: array of longitudes (decimal degrees)
+    :param lat: array of latitudes (decimal degrees)
+    :param tolerance_m: tolerance in meters
+    :returns boolean array, True for the points to keep (the first and last points are always kept)
+    """
+    lon = np.asarray(lon, dtype='float')
+    lat = np.asarray(lat, dtype='float')
+    n = len(lon)
+    keep = np.zeros(n, dtype='bool')
+    if n < 3:
+        keep[:] = True
+        return keep
+
+    # project to meters
+    lat0 = np.deg2rad(np.nanmean(lat))
+    x = np.deg2rad(lon) * EARTH_RADIUS_M * np.cos(lat0)
+    y = np.deg2rad(lat) * EARTH_RADIUS_M
+
+    keep[0] = True
+    keep[-1] = True
+    stack = [(0, n - 1)]
+    while len(stack) > 0:
+        i0, i1 = stack.pop()
+        if i1 - i0 < 2:
+            continue
+
+        # distance from each point between i0 and i1 to the segment from i0 to i1
+        px = x[i0 + 1:i1] - x[i0]
+        py = y[i0 + 1:i1] - y[i0]
+        dx = x[i1] - x[i0]
+        dy = y[i1] - y[i0]
+        seg_length2 = dx * dx + dy * dy
+        if seg_length2 > 0:
+            t = np.clip((px * dx + py * dy) / seg_length2, 0, 1)
+        else:
+            t = np.zeros(len(px))
+        dist = np.hypot(px - t * dx, py - t * dy)
+
+        imax = np.argmax(dist)
+        if dist[imax] > tolerance_m:
+            split = i0 + 1 + imax
+            keep[split] = True
+            stack.append((i0, split))
+            stack.append((split, i1))
+
+    return keep
+
+
+def simplify_track(track_df, tolerance_m):
+    """
+    Simplify a track with the Douglas-Peucker algorithm. For the time-enabled kmls, consecutive segments between the
+    points that are dropped are merged into one segment that spans the same time.
+    :param track_df: dataframe of the track with columns lon and lat, sorted by time
+    :param tolerance_m: tolerance in meters
+    :returns simplified dataframe
+    """
+    keep = douglas_peucker(track_df['lon'].to_numpy(), track_df['lat'].to_numpy(), tolerance_m)
+    return track_df.loc[keep].reset_index(drop=True)